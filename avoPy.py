@@ -17,7 +17,7 @@
 ###############################################################################
 '''
 from func.funcAVOModels import *
-from data.structLith import structLith, structAVOMod
+from data.structLith import structLith, structAVOBatch
 from avoPyConfig import *
 from templates.plots import *
 
@@ -41,9 +41,7 @@ source = bkm.ColumnDataSource(dict(
             vs_std=[ln.VsStd for ln in lithAr],
             rho_std=[ln.RhoStd for ln in lithAr]))
 
-intfMod=[]    
-for intf in intfAr:
-    intfMod.append(structAVOMod(intf[0],intf[1],nsim,std,nvar,intf[2]))
+intfMod=structAVOBatch(intfAr,nsim,std,nvar)
 
 pAVO=plotAVO(TOOLS,intfMod)
 pRPRS=plotRPRS(TOOLS,intfMod)
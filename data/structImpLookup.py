@@ -0,0 +1,122 @@
+###############################################################################
+
+# Author: Antony Hallam
+# Company: HWU
+# Date: 18-10-2026
+
+# File Name: structImpLookup.py
+
+# Synopsis:
+# Inverse lookup of pressure and saturation from impedance on a precomputed
+# pressure x saturation grid, e.g. the widgetFDI meshes.
+
+###############################################################################
+
+import numpy as np
+
+
+class structImpLookup(object):
+    """
+    Inverse of an impedance grid over water saturation (rows) and pressure (columns). Every pressure
+    column is split into runs where impedance is monotonic in saturation and each run is stored sorted,
+    so a query is a searchsorted per run followed by linear interpolation of saturation. The result is
+    every (pressure, saturation) pair on the grid pressures which matches the queried impedance.
+    """
+
+    def __init__(self, pres, sw, mesh):
+        """
+        :param pres: pressure vector (n_pres)
+        :param sw: water saturation vector (n_sw)
+        :param mesh: impedance (or impedance change) grid of shape (n_sw, n_pres)
+        """
+        self.pres = np.asarray(pres, dtype=float)
+        self.sw = np.asarray(sw, dtype=float)
+        mesh = np.asarray(mesh, dtype=float)
+        if mesh.shape != (self.sw.size, self.pres.size):
+            raise ValueError('mesh must have shape (n_sw, n_pres)')
+        # (pressure, sorted impedance, saturation, impedance of the turning point shared with the
+        # previous run). Runs are half-open, the shared point is only answered by the earlier run.
+        self.runs = []
+        for j in range(self.pres.size):
+            for start, stop in self.calcMonotonicRuns(mesh[:, j]):
+                imp = mesh[start:stop+1, j]; sw = self.sw[start:stop+1]
+                turn = mesh[start, j] if start > 0 else np.nan
+                if imp[-1] < imp[0]:
+                    imp = imp[::-1]; sw = sw[::-1]
+                self.runs.append((self.pres[j], imp, sw, turn))
+
+    @classmethod
+    def fromFDI(cls, fdi, key='mesh_dpimp'):
+        """
+        :param fdi: widgetFDI with a model (see widgetFDI.updateModel)
+        :keyword key: mesh to invert, 'mesh_dpimp' (% impedance change) or 'mesh_pimp' (impedance)
+        """
+        return cls(fdi.vec_dict['pres'], fdi.vec_dict['sw'], fdi.mesh_dict[key])
+
+    @staticmethod
+    def calcMonotonicRuns(vec):
+        """
+        :return: list of (start, stop) inclusive index pairs of the monotonic runs of vec
+        """
+        sign = np.sign(np.diff(vec))
+        for i in range(1, sign.size):  # flat steps continue the current run
+            if sign[i] == 0:
+                sign[i] = sign[i-1]
+        turns = np.flatnonzero(sign[1:]*sign[:-1] < 0) + 1
+        bounds = np.concatenate([[0], turns, [vec.size-1]])
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def query(self, imp):
+        """
+        :param imp: array of observed impedances (same units as the mesh)
+        :return: index into imp, pressure and saturation arrays of all candidate pairs
+        """
+        imp = np.atleast_1d(np.asarray(imp, dtype=float)).ravel()
+        qind = []; qpres = []; qsw = []
+        for pres, rimp, rsw, turn in self.runs:
+            if rimp.size < 2:
+                continue
+            ok = np.flatnonzero((imp >= rimp[0]) & (imp <= rimp[-1]) & (imp != turn))
+            if ok.size == 0:
+                continue
+            i = np.clip(np.searchsorted(rimp, imp[ok]), 1, rimp.size-1)
+            dimp = rimp[i] - rimp[i-1]
+            t = np.where(dimp == 0, 0., (imp[ok] - rimp[i-1]) / np.where(dimp == 0, 1., dimp))
+            qind.append(ok); qpres.append(np.full(ok.size, pres))
+            qsw.append(rsw[i-1] + t*(rsw[i] - rsw[i-1]))
+        if not qind:
+            return np.empty(0, dtype=int), np.empty(0), np.empty(0)
+        qind = np.concatenate(qind); order = np.argsort(qind, kind='stable')
+        return qind[order], np.concatenate(qpres)[order], np.concatenate(qsw)[order]
+
+
+if __name__ == "__main__":
+    from tests import test_msg, test_title_msg
+    import time
+
+    test_title_msg('structImpLookup')
+    pres = np.linspace(8, 16, 81); sw = np.linspace(0, 1, 101)
+    mesh_pres, mesh_sw = np.meshgrid(pres, sw)
+    mesh = 5*mesh_sw + 0.5*(mesh_pres - 12)    # monotonic in sw
+    lookup = structImpLookup(pres, sw, mesh)
+    qind, qpres, qsw = lookup.query([1.0])
+    test_msg('structImpLookup', 'candidates on forward model', np.allclose(5*qsw + 0.5*(qpres - 12), 1.0), True)
+    test_msg('structImpLookup', 'candidate at pressure 12', np.round(qsw[np.isclose(qpres, 12)], 10).tolist(), [0.2])
+
+    mesh = 4*(mesh_sw - 0.5)**2                # non-monotonic in sw
+    lookup = structImpLookup(pres, sw, mesh)
+    qind, qpres, qsw = lookup.query([0.36])
+    test_msg('structImpLookup', 'two roots per pressure', np.round(np.unique(qsw), 10).tolist(), [0.2, 0.8])
+    qind, qpres, qsw = lookup.query([0.0])
+    test_msg('structImpLookup', 'one root at the turning point', (qind.size, np.unique(qpres).size), (pres.size, pres.size))
+    test_msg('structImpLookup', 'turning point saturation', np.round(np.unique(qsw), 10).tolist(), [0.5])
+    qind, qpres, qsw = lookup.query([1.0])
+    test_msg('structImpLookup', 'roots at the ends kept', np.round(np.unique(qsw), 10).tolist(), [0.0, 1.0])
+    qind, qpres, qsw = lookup.query([2.0])
+    test_msg('structImpLookup', 'no candidates out of range', qind.size, 0)
+
+    nq = 10000
+    obs = np.random.uniform(0, 1, nq)
+    t0 = time.time(); qind, qpres, qsw = lookup.query(obs); t1 = time.time()
+    print('%d queries in %.4f s' % (nq, t1 - t0))
+    test_msg('structImpLookup', 'every query answered', np.unique(qind).size, nq)
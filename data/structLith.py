@@ -11,16 +11,79 @@
 
 ###############################################################################
 
-from func.funcAVOModels import calcRandNorm, calcAVO
-from func.funcRP import calcModVRH, calcDryFrame_dPres, gassmann_dry2fluid, mixfluid, calcVelp, calcVels
+from func.funcAVOModels import calcRandNorm, calcRandMVNorm, calcAVO
+from func.funcRP import calcModVRH, calcDryFrame_dPres, gassmann_dry2fluid, mixfluid, calcVelp, calcVels, \
+    calcBWFluids
+from data.structStats import structStreamStats
 import numpy as np
 import copy
+from collections import namedtuple
+from functools import lru_cache, wraps
+from concurrent.futures import ProcessPoolExecutor
 
 
-class structMineral(object):
+# default critical porosity values in fractions, see calcDryFrame_dPres
+critphi_default = (0.3521, 0, 0.3521, 0, 0.1499)
+
+
+class structRecord(object):
+    """
+    Base for the immutable structLith parameter records. Subclasses list their constructor
+    arguments in _fields (in positional order) and any derived values in the remaining
+    __slots__. Records compare and hash on _fields and are rebuilt rather than modified,
+    use _replace to get a copy with new parameters.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def _set(self, **kwargs):
+        for key, val in kwargs.items():
+            object.__setattr__(self, key, val)
+
+    def __setattr__(self, key, val):
+        raise AttributeError("%s is immutable, use _replace" % type(self).__name__)
+
+    def __delattr__(self, key):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def _astuple(self):
+        return tuple(getattr(self, field) for field in self._fields)
+
+    def _asdict(self):
+        return dict(zip(self._fields, self._astuple()))
+
+    def _replace(self, **kwargs):
+        """
+        :return: a new record with the constructor arguments in kwargs replaced
+        """
+        args = [kwargs.pop(field, getattr(self, field)) for field in self._fields]
+        if kwargs:
+            raise ValueError('Got unexpected field names: %r' % list(kwargs))
+        return type(self)(*args)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._astuple() == other._astuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self).__name__,) + self._astuple())
+
+    def __reduce__(self):
+        return (type(self), self._astuple())
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join('%s=%r' % item for item in zip(self._fields, self._astuple())))
+
+
+class structMineral(structRecord):
     """
     This class is used to represent and model mineral properties.
     """
+    __slots__ = ('name', 'K', 'Mu', 'den')
+    _fields = ('name', 'K', 'Mu', 'den')
 
     def __init__(self, name, bulkmod, shearMod, rho):
         """
@@ -29,30 +92,40 @@ class structMineral(object):
         shearMod - shear Modulus Mu (GPa)
         rho - mineral density (g/cc)
         """
-        self.name = name
-        self.K = bulkmod
-        self.Mu = shearMod
-        self.den = rho
+        self._set(name=name, K=bulkmod, Mu=shearMod, den=rho)
 
 
-class structFluid(object):
+class structFluid(structRecord):
     """
     This class is used to represent and model fluid properties.
     """
+    __slots__ = ('name', 'water', 'oil', 'gas', 'K', 'rho')
+    _fields = ('name', 'water', 'oil', 'gas')
 
-    def __init__(self, name, water=[2.96,1.056,0.5], oil=[0.636,0.686,0.25], gas=[0.017,0.145,0.25]):
+    def __init__(self, name, water=(2.96,1.056,0.5), oil=(0.636,0.686,0.25), gas=(0.017,0.145,0.25)):
         """
         :param name: string to use for the name of the fluid.
-        :keyword water: list of bulkModulus, density, saturation
-        :keyword oil: list of bulkModulus, density, saturation
-        :keyword gas: list of bulkModulus, density, saturation
+        :keyword water: sequence of bulkModulus, density, saturation
+        :keyword oil: sequence of bulkModulus, density, saturation
+        :keyword gas: sequence of bulkModulus, density, saturation
         Units: bulkModulus in GPa, density in (g/cc), saturation in frac where the sum of 3 phases should add to 1).
         """
-        self.name = name     #fluid name
-        self.water = water; self.oil = oil; self.gas = gas
-        self.K = 0           #mixed fluid bulk modulus
-        self.rho = 0         #mixed fluid density
-        self.mixfluids()     #calcuate mixed fluid properties
+        self._set(name=name, water=tuple(water), oil=tuple(oil), gas=tuple(gas))
+        K, rho = self.mixfluids()
+        self._set(K=K, rho=rho)  #mixed fluid bulk modulus and density
+
+    @classmethod
+    def fromBW(cls, name, pres, pvt, sats):
+        """
+        Fluid with phase properties from the Batzle and Wang (1992) correlations.
+        :param name: string to use for the name of the fluid.
+        :param pres: pore pressure (MPa)
+        :param pvt: dict of temp (degC), sal (weight fraction), api and grav (gas gravity)
+        :param sats: water, oil, gas saturations
+        """
+        water, oil, gas = calcBWFluids(pres, pvt)
+        return cls(name, *[tuple(float(prop) for prop in phase) + (sat,)
+                           for phase, sat in zip([water, oil, gas], sats)])
 
     def getKs(self):
         return [self.water[0],self.oil[0],self.gas[0]]
@@ -64,42 +137,65 @@ class structFluid(object):
         return [self.water[2],self.oil[2],self.gas[2]]
 
     def mixfluids(self):
-        self.K, self.rho = mixfluid(self.water,self.oil,self.gas)
+        """
+        :return: mixed fluid bulk modulus and density
+        """
+        return mixfluid(self.water,self.oil,self.gas)
 
     def updateSat(self, sat):
-        self.water[2] = sat[0]; self.oil[2] = sat[1]; self.gas[2] = sat[2]
-        self.mixfluids()
+        """
+        :param sat: water, oil, gas saturations
+        :return: new structFluid with the saturations replaced
+        """
+        return self._replace(water=self.water[:2]+(sat[0],), oil=self.oil[:2]+(sat[1],),
+                             gas=self.gas[:2]+(sat[2],))
 
 
-class structDryFrame(object):
+class structDryFrame(structRecord):
     """
     This class is used to represent dry frames of mixed structMinerals.
     """
+    __slots__ = ('name', 'nonshale', 'shale', 'vshale', 'phi', 'vsgrad', 'depth', 'initp', 'resp', 'mod', 'c',
+                 'fracshale', 'fracnonshale', 'rho', 'Km_voigt', 'Km_reuss', 'Km_vrh', 'Gm_voigt', 'Gm_reuss',
+                 'Gm_vrh', 'vstress', 'peffi', 'peff', 'Kdry', 'Gdry')
+    _fields = ('name', 'nonshale', 'shale', 'vshale', 'phi', 'vsgrad', 'depth', 'initp', 'resp', 'mod', 'c')
 
-    def __init__(self, name, nonshale, shale, vshale, phi):
+    def __init__(self, name, nonshale, shale, vshale, phi, vsgrad=None, depth=None, initp=None, resp=None,
+                 mod=None, c=critphi_default):
         """
+        The rock matrix is always calculated, the dry frame moduli Kdry and Gdry only when the
+        stress regieme is given (see calcDryFrame).
         :param name: Name of the rock
         :param nonshale: takes arguments of type structMineral
         :param shale: takes arguments of type structMineral
         :param vshale: the fraction of volume shale
         :param phi: porosity of the rock
+        :keyword vsgrad, depth, initp, resp: see calcDryFrame
+        :keyword mod: dry frame parameters Ek, Pk, Eg, Pg
+        :keyword c: critical porosity values in fractions
         """
-        self.name = name
-        self.nonshale = nonshale;
-        self.shale = shale;
-        self.vshale = vshale
-        self.phi = phi
-        # define critical porosity values in fractions.
-        self.c = [0.3521, 0, 0.3521, 0, 0.1499]
-        self.fracshale = self.vshale / (1. - self.phi)  # fraction rock shale
-        self.fracnonshale = (1. - self.vshale - self.phi) / (1. - self.phi)  # fraction rock not shale
-        self.rho = self.fracshale*self.shale.den + self.fracnonshale*self.nonshale.den
+        self._set(name=name, nonshale=nonshale, shale=shale, vshale=vshale, phi=phi, vsgrad=vsgrad, depth=depth,
+                  initp=initp, resp=resp, mod=None if mod is None else tuple(mod), c=tuple(c))
+        fracshale, fracnonshale, rho, (Km_voigt, Km_reuss, Km_vrh), (Gm_voigt, Gm_reuss, Gm_vrh) = \
+            calcMatrixCached(nonshale, shale, vshale, phi)
+        self._set(fracshale=fracshale, fracnonshale=fracnonshale, rho=rho,
+                  Km_voigt=Km_voigt, Km_reuss=Km_reuss, Km_vrh=Km_vrh,
+                  Gm_voigt=Gm_voigt, Gm_reuss=Gm_reuss, Gm_vrh=Gm_vrh)
+        if self.mod is None:
+            self._set(vstress=None, peffi=None, peff=None, Kdry=None, Gdry=None)
+        else:
+            Ek, Pk, Eg, Pg = self.mod
+            self._set(vstress=vsgrad*depth)
+            self._set(peffi=self.vstress - initp,  #effective initial pressure
+                      peff=self.vstress - resp)    #effective current pressure
+            self._set(Kdry=calcDryFrame_dPres(self.peffi,self.peff,self.Km_vrh,Ek,Pk,self.phi,c=self.c),
+                      Gdry=calcDryFrame_dPres(self.peffi,self.peff,self.Gm_vrh,Eg,Pg,self.phi,c=self.c))
 
     def calcRockMatrix(self): #calculate the voigt-reuss bounds
-        self.Km_voigt, self.Km_reuss, self.Km_vrh = calcModVRH(self.fracshale, self.shale.K,
-                                                               self.fracnonshale, self.nonshale.K)
-        self.Gm_voigt, self.Gm_reuss, self.Gm_vrh = calcModVRH(self.fracshale, self.shale.Mu,
-                                                               self.fracnonshale, self.nonshale.Mu)
+        """
+        :return: (Km_voigt, Km_reuss, Km_vrh), (Gm_voigt, Gm_reuss, Gm_vrh)
+        """
+        return calcMatrixCached(self.nonshale, self.shale, self.vshale, self.phi)[3:]
 
     def calcDryFrame(self,vsgrad,depth,initp,resp,Ek,Pk,Eg,Pg):
         """
@@ -108,47 +204,373 @@ class structDryFrame(object):
         :param depth: Depth for calculation (meters TVDSS) be careful for deep water.
         :param initp: Initial Reservoir Pressure (MPa)
         :param resp: Current Reservoir Pressure (MPa)
+        :return: new structDryFrame with Kdry and Gdry
         """
-        self.vsgrad = vsgrad; self.depth = depth;
-        self.initp = initp; self.resp=resp
-        self.vstress = vsgrad*depth
-        self.peffi = self.vstress - initp #effective initial pressure
-        self.peff = self.vstress - resp   #effective current pressure
-        self.mod = [Ek,Pk,Eg,Pg]
-
-        self.Kdry = calcDryFrame_dPres(self.peffi,self.peff,self.Km_vrh,Ek,Pk,self.phi,c=self.c)
-        self.Gdry = calcDryFrame_dPres(self.peffi,self.peff,self.Gm_vrh,Eg,Pg,self.phi,c=self.c)
+        return self._replace(vsgrad=vsgrad, depth=depth, initp=initp, resp=resp, mod=(Ek,Pk,Eg,Pg))
 
     def calcKSat(self,fluidK):
         return gassmann_dry2fluid(self.Kdry,self.Km_vrh,fluidK,self.phi)
 
     def updatePres(self,newresp):
-        self.calcDryFrame(self.vsgrad,self.depth,self.initp,newresp,*self.mod)
+        """
+        :return: new structDryFrame at the current reservoir pressure newresp
+        """
+        return self._replace(resp=newresp)
+
 
-class structRock(object):
+class structRock(structRecord):
     """
     This class combines the fundamentals to build rocks.
     """
+    __slots__ = ('dryFrame', 'fluid', 'Ksat', 'den', 'velp', 'vels', 'pimp', 'simp', 'vpvs')
+    _fields = ('dryFrame', 'fluid')
+
     def __init__(self,dryFrame,fluid):
         """
-        Input a populated structDryFrame and structFluid
+        Input a structDryFrame with a stress regieme (see structDryFrame.calcDryFrame) and a structFluid
         :param dryFrame:
         :param fluid:
         """
-        self.dryFrame = dryFrame; self.fluid=fluid
+        if dryFrame.Kdry is None:
+            raise ValueError('structRock needs a dry frame with a stress regieme, see structDryFrame.calcDryFrame')
+        self._set(dryFrame=dryFrame, fluid=fluid)
+        self._set(Ksat=self.calcGassmann(), den=self.calcDensity())
+        velp, vels, pimp, simp, vpvs = self.calcElastic()
+        self._set(velp=velp, vels=vels, pimp=pimp, simp=simp, vpvs=vpvs)
 
     def calcGassmann(self):
-        self.Ksat = self.dryFrame.calcKSat(self.fluid.K)
+        return self.dryFrame.calcKSat(self.fluid.K)
 
     def calcDensity(self):
-        self.den = self.dryFrame.rho + self.fluid.rho*self.dryFrame.phi
+        return self.dryFrame.rho + self.fluid.rho*self.dryFrame.phi
 
     def calcElastic(self):
-        self.vels = calcVels(self.dryFrame.Gdry, self.den)
-        self.velp = calcVelp(self.Ksat, self.dryFrame.Gdry, self.den);
-        self.pimp = self.velp * self.den;
-        self.simp = self.vels * self.den;
-        self.vpvs = self.velp / self.vels;
+        """
+        :return: velp, vels, pimp, simp, vpvs
+        """
+        vels = calcVels(self.dryFrame.Gdry, self.den)
+        velp = calcVelp(self.Ksat, self.dryFrame.Gdry, self.den)
+        return velp, vels, velp*self.den, vels*self.den, velp/vels
+
+
+# Parameter keyed caches of the structLith records. The records hash on their parameters so
+# toggling between previously selected scenarios returns the stored results.
+cachesize = 256
+
+
+def hashableCache(maxsize=cachesize):
+    """
+    lru_cache which is bypassed when an argument is unhashable, e.g. numpy arrays of porosity logs
+    (or records holding them), the function is then called uncached.
+    """
+    def decorator(func):
+        cached = lru_cache(maxsize=maxsize)(func)
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                hash((args, tuple(kwargs.items())))
+            except TypeError:
+                return func(*args, **kwargs)
+            return cached(*args, **kwargs)
+        wrapper.cache_info = cached.cache_info
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorator
+
+
+@hashableCache()
+def calcMatrixCached(nonshale, shale, vshale, phi):
+    """
+    Rock matrix of a structDryFrame, independent of the stress regieme.
+    :param nonshale: structMineral
+    :param shale: structMineral
+    :param vshale: the fraction of volume shale
+    :param phi: porosity of the rock
+    :return: fracshale, fracnonshale, rho, (Km_voigt, Km_reuss, Km_vrh), (Gm_voigt, Gm_reuss, Gm_vrh)
+    """
+    fracshale = vshale / (1. - phi)                  # fraction rock shale
+    fracnonshale = (1. - vshale - phi) / (1. - phi)  # fraction rock not shale
+    rho = fracshale*shale.den + fracnonshale*nonshale.den
+    return (fracshale, fracnonshale, rho, calcModVRH(fracshale, shale.K, fracnonshale, nonshale.K),
+            calcModVRH(fracshale, shale.Mu, fracnonshale, nonshale.Mu))
+
+
+@hashableCache()
+def getDryFrame(name, nonshale, shale, vshale, phi, vsgrad=None, depth=None, initp=None, resp=None, mod=None,
+                c=critphi_default):
+    """
+    Cached structDryFrame, arguments as structDryFrame (mod and c must be tuples).
+    """
+    return structDryFrame(name, nonshale, shale, vshale, phi, vsgrad, depth, initp, resp, mod, c)
+
+
+@hashableCache()
+def getFluid(name, water, oil, gas):
+    """
+    Cached structFluid, arguments as structFluid (water, oil and gas must be tuples).
+    """
+    return structFluid(name, water, oil, gas)
+
+
+@hashableCache()
+def getRock(dryFrame, fluid):
+    """
+    Cached structRock.
+    """
+    return structRock(dryFrame, fluid)
+
+
+cachedfuncs = [calcMatrixCached, getDryFrame, getFluid, getRock]
+
+
+def cacheInfo():
+    """
+    :return: dict of function name to lru_cache CacheInfo (hits, misses, maxsize, currsize)
+    """
+    return dict((func.__name__, func.cache_info()) for func in cachedfuncs)
+
+
+def cacheClear():
+    for func in cachedfuncs:
+        func.cache_clear()
+
+
+class structRockModel(object):
+    """
+    Lazy rock model with dependency tracking. The inputs of structDryFrame and structFluid are set
+    with set() and derived quantities are calculated on request by get() (or attribute access).
+    Changing an input only invalidates the quantities which depend upon it, e.g. a saturation change
+    redoes fluid mixing, Gassmann and the elastic properties but keeps the dry frame. The dry frame,
+    fluid and rock nodes come from the parameter keyed caches (getDryFrame, getFluid, getRock) so
+    returning to previously set inputs does not recalculate them.
+    """
+    inputs = ['nonshale', 'shale', 'vshale', 'phi', 'vsgrad', 'depth', 'initp', 'resp', 'mod', 'c',
+              'water', 'oil', 'gas']
+    # node: dependencies (inputs or nodes)
+    nodes = {'matrix': ['nonshale', 'shale', 'vshale', 'phi'],
+             'stress': ['vsgrad', 'depth', 'initp', 'resp'],
+             'dry': ['matrix', 'stress', 'mod', 'phi', 'c'],
+             'fluid': ['water', 'oil', 'gas'],
+             'rock': ['dry', 'fluid']}
+    # output: (node, index or attribute of the node value)
+    outputs = {'fracshale': ('matrix', 0), 'fracnonshale': ('matrix', 1), 'rho': ('matrix', 2),
+               'Km_vrh': ('matrix', 3, 2), 'Gm_vrh': ('matrix', 4, 2),
+               'vstress': ('stress', 0), 'peffi': ('stress', 1), 'peff': ('stress', 2),
+               'Kdry': ('dry', 'Kdry'), 'Gdry': ('dry', 'Gdry'), 'fluidK': ('fluid', 'K'), 'fluidRho': ('fluid', 'rho'),
+               'Ksat': ('rock', 'Ksat'), 'den': ('rock', 'den'), 'velp': ('rock', 'velp'), 'vels': ('rock', 'vels'),
+               'pimp': ('rock', 'pimp'), 'simp': ('rock', 'simp'), 'vpvs': ('rock', 'vpvs')}
+
+    def __init__(self, nonshale, shale, vshale, phi, vsgrad, depth, initp, resp, mod,
+                 water=(2.96,1.056,0.5), oil=(0.636,0.686,0.25), gas=(0.017,0.145,0.25), c=critphi_default):
+        """
+        Arguments as structDryFrame, structDryFrame.calcDryFrame and structFluid.
+        :param mod: dry frame parameters Ek, Pk, Eg, Pg
+        """
+        self._inputs = dict(); self._values = dict()
+        self.recomputes = dict.fromkeys(self.nodes, 0)  # number of calculations of each node
+        self._dependents = self.calcDependents()
+        self.set(nonshale=nonshale, shale=shale, vshale=vshale, phi=phi, vsgrad=vsgrad, depth=depth, initp=initp,
+                 resp=resp, mod=tuple(mod), c=tuple(c), water=tuple(water), oil=tuple(oil), gas=tuple(gas))
+
+    @classmethod
+    def fromRecords(cls, dryFrame, fluid):
+        """
+        :param dryFrame: structDryFrame with a stress regieme
+        :param fluid: structFluid
+        """
+        return cls(dryFrame.nonshale, dryFrame.shale, dryFrame.vshale, dryFrame.phi, dryFrame.vsgrad,
+                   dryFrame.depth, dryFrame.initp, dryFrame.resp, dryFrame.mod, fluid.water, fluid.oil, fluid.gas,
+                   c=dryFrame.c)
+
+    @classmethod
+    def calcDependents(cls):
+        """
+        :return: dict of input or node to the set of all nodes downstream of it
+        """
+        dependents = dict((key, set()) for key in cls.inputs + list(cls.nodes))
+        def walk(node, key):
+            for dep in cls.nodes[node]:
+                dependents[dep].add(key)
+                if dep in cls.nodes:
+                    walk(dep, key)
+        for node in cls.nodes:
+            walk(node, node)
+        return dependents
+
+    def set(self, **kwargs):
+        """
+        Set model inputs, invalidating the derived quantities which depend on changed inputs.
+        """
+        for key, val in kwargs.items():
+            if key not in self.inputs:
+                raise KeyError('%s is not an input of structRockModel' % key)
+            if key in self._inputs and self._inputs[key] == val:
+                continue
+            self._inputs[key] = val
+            for node in self._dependents[key]:
+                self._values.pop(node, None)
+
+    def updateSat(self, sat):
+        self.set(water=self.water[:2]+(sat[0],), oil=self.oil[:2]+(sat[1],), gas=self.gas[:2]+(sat[2],))
+
+    def updatePres(self, newresp):
+        self.set(resp=newresp)
+
+    def get(self, key):
+        """
+        :param key: an input, node or output name
+        """
+        if key in self._inputs:
+            return self._inputs[key]
+        if key in self.outputs:
+            val = self.get(self.outputs[key][0])
+            for ind in self.outputs[key][1:]:
+                val = getattr(val, ind) if isinstance(ind, str) else val[ind]
+            return val
+        if key not in self.nodes:
+            raise KeyError(key)
+        if key not in self._values:
+            self._values[key] = getattr(self, '_calc_' + key)()
+            self.recomputes[key] += 1
+        return self._values[key]
+
+    def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
+        try:
+            return self.get(key)
+        except KeyError:
+            raise AttributeError(key)
+
+    def getKs(self):
+        return [self.water[0],self.oil[0],self.gas[0]]
+
+    def getRhos(self):
+        return [self.water[1],self.oil[1],self.gas[1]]
+
+    def getSats(self):
+        return [self.water[2],self.oil[2],self.gas[2]]
+
+    def _calc_matrix(self):
+        return calcMatrixCached(self.nonshale, self.shale, self.vshale, self.phi)
+
+    def _calc_stress(self):
+        vstress = self.vsgrad*self.depth
+        return vstress, vstress - self.initp, vstress - self.resp
+
+    def _calc_dry(self):
+        return getDryFrame('', self.nonshale, self.shale, self.vshale, self.phi, self.vsgrad, self.depth,
+                           self.initp, self.resp, self.mod, self.c)
+
+    def _calc_fluid(self):
+        return getFluid('', self.water, self.oil, self.gas)
+
+    def _calc_rock(self):
+        return getRock(self.dry, self.fluid)
+
+
+class structRockBatch(object):
+    """
+    Structure of arrays for many rocks. The mineral, dry frame, pressure and fluid parameters
+    of every rock are held as column arrays and the structMineral -> structDryFrame ->
+    structFluid -> structRock pipeline is run as one vectorized pass.
+    """
+
+    rockcols = ['kclay', 'muclay', 'rhoclay', 'knonclay', 'munonclay', 'rhononclay',
+                'vclay', 'phi', 'dryEk', 'dryPk', 'dryEg', 'dryPg']
+    fluidcols = ['kw', 'rhow', 'sw', 'ko', 'rhoo', 'so', 'kg', 'rhog', 'sg']
+    prescols = ['OB_Grad', 'init_Pres', 'curr_Pres']
+
+    def __init__(self, rocks, fluids, pres, depth, c=None):
+        """
+        Inputs are any mapping of the column names used in the geoPy input files (e.g. a pandas
+        DataFrame, Series or dict) to scalars or arrays. All columns broadcast together so a
+        single fluid or pressure row can be applied to every rock.
+        :param rocks: mapping with the columns of rockcols
+        :param fluids: mapping with the columns of fluidcols
+        :param pres: mapping with the columns of prescols
+        :param depth: depth for calculation (meters TVDSS), scalar or array
+        :keyword c: critical porosity vector, default critphi_default
+        """
+        for cols, source in [(self.rockcols, rocks), (self.fluidcols, fluids), (self.prescols, pres)]:
+            for col in cols:
+                setattr(self, col, np.asarray(source[col], dtype=float))
+        self.depth = np.asarray(depth, dtype=float)
+        self.c = critphi_default if c is None else c
+        self.calc()
+
+    @classmethod
+    def fromCombinations(cls, rocks, fluids, pres, depth, c=None):
+        """
+        Every combination of the rows of the rock, fluid and pressure tables.
+        :param rocks, fluids, pres: pandas DataFrames as read from the geoPy input files
+        :param depth: depth for calculation (meters TVDSS)
+        :return: structRockBatch with outputs of shape (n_rocks, n_fluids, n_pres)
+        """
+        def axis(df, cols, i):
+            shape = [1, 1, 1]; shape[i] = len(df)
+            return dict((col, np.asarray(df[col], dtype=float).reshape(shape)) for col in cols)
+        return cls(axis(rocks, cls.rockcols, 0), axis(fluids, cls.fluidcols, 1),
+                   axis(pres, cls.prescols, 2), depth, c=c)
+
+    @classmethod
+    def fromDepthProfile(cls, rocks, fluids, pres, depth, refdepth=None, c=None):
+        """
+        Depth trends for a rock, fluid and pressure profile. Rock and fluid entries are scalars (e.g. a
+        row of the geoPy input files) or arrays the length of depth (e.g. well logs).
+        If pres has a 'Pres_Grad' entry (pore pressure gradient MPa/m) init_Pres and curr_Pres are taken as
+        the pressures at refdepth and follow the gradient with depth (not below 0 MPa), otherwise they are constant.
+        Constant pressures exceed the overburden stress at shallow depths, profiles with a negative effective
+        stress raise a ValueError so shallow profiles need a Pres_Grad.
+        The depth dependence is through the MacBeth stress sensitivity of the dry frame to the change from
+        the initial to the current effective stress. Where init_Pres equals curr_Pres (e.g. the shipped
+        geoPy_Pres.csv without depletion) the ratio cancels and the profiles are constant with depth.
+        :param depth: vector of depths (meters TVDSS)
+        :keyword refdepth: depth of init_Pres and curr_Pres (meters TVDSS)
+        :return: structRockBatch with outputs the shape of depth
+        """
+        depth = np.asarray(depth, dtype=float)
+        profile = dict((col, np.asarray(pres[col], dtype=float)) for col in cls.prescols)
+        if 'Pres_Grad' in pres:
+            if refdepth is None:
+                raise ValueError('refdepth is required for a Pres_Grad pressure profile')
+            for col in ['init_Pres', 'curr_Pres']:
+                profile[col] = np.maximum(profile[col] + float(pres['Pres_Grad'])*(depth - refdepth), 0.)
+        vstress = profile['OB_Grad']*depth
+        shallow = (vstress < profile['init_Pres']) | (vstress < profile['curr_Pres'])
+        if np.any(shallow):
+            raise ValueError('negative effective stress above %.0f m, give a Pres_Grad for shallow profiles'
+                             % np.max(np.broadcast_to(depth, shallow.shape)[shallow]))
+        return cls(rocks, fluids, profile, depth, c=c)
+
+    def calc(self):
+        # rock matrix
+        self.fracshale = self.vclay / (1. - self.phi)
+        self.fracnonshale = (1. - self.vclay - self.phi) / (1. - self.phi)
+        self.rho = self.fracshale*self.rhoclay + self.fracnonshale*self.rhononclay
+        self.Km_voigt, self.Km_reuss, self.Km_vrh = calcModVRH(self.fracshale, self.kclay,
+                                                               self.fracnonshale, self.knonclay)
+        self.Gm_voigt, self.Gm_reuss, self.Gm_vrh = calcModVRH(self.fracshale, self.muclay,
+                                                               self.fracnonshale, self.munonclay)
+        # dry frame
+        self.vstress = self.OB_Grad*self.depth
+        self.peffi = self.vstress - self.init_Pres
+        self.peff = self.vstress - self.curr_Pres
+        self.Kdry = calcDryFrame_dPres(self.peffi, self.peff, self.Km_vrh, self.dryEk, self.dryPk,
+                                       self.phi, c=self.c)
+        self.Gdry = calcDryFrame_dPres(self.peffi, self.peff, self.Gm_vrh, self.dryEg, self.dryPg,
+                                       self.phi, c=self.c)
+        # fluid, gassmann and elastic properties
+        self.fluidK, self.fluidRho = mixfluid([self.kw, self.rhow, self.sw], [self.ko, self.rhoo, self.so],
+                                              [self.kg, self.rhog, self.sg])
+        self.Ksat = gassmann_dry2fluid(self.Kdry, self.Km_vrh, self.fluidK, self.phi)
+        self.den = self.rho + self.fluidRho*self.phi
+        self.vels = calcVels(self.Gdry, self.den)
+        self.velp = calcVelp(self.Ksat, self.Gdry, self.den)
+        self.pimp = self.velp * self.den
+        self.simp = self.vels * self.den
+        self.vpvs = self.velp / self.vels
+
 
 class structLith(object):
     """ 
@@ -170,20 +592,74 @@ class structLith(object):
         self.VsStd = VsStd
         self.RhoStd = RhoStd
 
-    def calcModel(self, nsims, std, var):
+    def calcCholesky(self, std, corr=None, cov=None):
+        """
+        Lower Cholesky factor of the Vp, Vs, Rho covariance. Factors are cached per lithology
+        so repeated models only pay for the factorisation once.
+        :param std: number of standard deviations to model, scales VpStd, VsStd and RhoStd
+        :keyword corr: (3,3) correlation matrix of Vp, Vs and Rho
+        :keyword cov: (3,3) covariance matrix of Vp, Vs and Rho, used instead of corr and std
+        :return: (3,3) lower Cholesky factor
+        """
+        if cov is not None:
+            key = ('cov', np.asarray(cov, dtype=float).tobytes())
+        else:
+            key = ('corr', float(std), np.asarray(corr, dtype=float).tobytes())
+        if not hasattr(self, '_chol'):
+            self._chol = dict()
+        if key not in self._chol:
+            if cov is None:
+                cov = calcLithCovariance(calcLithProps([self]), std, corr)[0]
+            self._chol[key] = np.linalg.cholesky(cov)
+        return self._chol[key]
+
+    def sampleModel(self, nsims, std, var, rng=None, chol=None):
+        """
+        Draws one chunk of stochastic models for this lithology. calcModel and iterModel both
+        sample through here, and calcLithModels for the draws themselves.
+        :param nsims: number of simulations
+        :param std: number of standard deviations to model
+        :param var: variation allowed around the seed point
+        :keyword rng: numpy Generator to draw from, None uses the global np.random state
+        :keyword chol: (3,3) lower Cholesky factor for correlated sampling, None is independent
+        :return: seed array, dict of VpMod, VsMod, RhoMod, AIMod, SIMod, VPVSMod, lmrMod, murMod
+        """
+        chol = None if chol is None else np.asarray(chol)[np.newaxis]
+        seed, VpMod, VsMod, RhoMod = calcLithSample(calcLithProps([self]), nsims, std, var,
+                                                    rng=rng, chol=chol)
+        return seed[0], calcModelProps(VpMod[0], VsMod[0], RhoMod[0])
+
+    def calcModel(self, nsims, std, var, rng=None, corr=None, cov=None):
+        """
+        :keyword rng: numpy Generator to draw from, None uses the global np.random state
+        :keyword corr: (3,3) correlation matrix of Vp, Vs and Rho for correlated sampling
+        :keyword cov: (3,3) covariance matrix of Vp, Vs and Rho for correlated sampling
+        """
         self.nsims = nsims
         self.var = var
         self.mSdt = std
 
-        self.seed = np.random.rand(nsims)
-        self.VpMod = calcRandNorm(self.Vp, self.VpStd * std, self.seed, var)
-        self.VsMod = calcRandNorm(self.Vs, self.VsStd * std, self.seed, var)
-        self.RhoMod = calcRandNorm(self.Rho, self.RhoStd * std, self.seed, var)
-        self.AIMod = self.VpMod * self.RhoMod
-        self.SIMod = self.VsMod * self.RhoMod
-        self.VPVSMod = self.VpMod / self.VsMod
-        self.lmrMod = self.AIMod * self.AIMod - 2 * self.SIMod * self.SIMod
-        self.murMod = self.SIMod * self.SIMod
+        chol = None if corr is None and cov is None else self.calcCholesky(std, corr, cov)
+        self.seed, mod = self.sampleModel(nsims, std, var, rng=rng, chol=chol)
+        for key, val in mod.items():
+            setattr(self, key, val)
+
+    def iterModel(self, nsims, std, var, chunksize, rng=None, corr=None, cov=None):
+        """
+        Generator version of calcModel which yields the models in chunks so nsims is not
+        bounded by memory. The models are not stored on the lithology.
+        :param nsims: total number of simulations
+        :param std: number of standard deviations to model
+        :param var: variation allowed around the seed point
+        :param chunksize: number of simulations per chunk
+        :keyword rng: numpy Generator to draw from, None uses the global np.random state
+        :keyword corr: (3,3) correlation matrix of Vp, Vs and Rho for correlated sampling
+        :keyword cov: (3,3) covariance matrix of Vp, Vs and Rho for correlated sampling
+        :return: yields dict of VpMod, VsMod, RhoMod, AIMod, SIMod, VPVSMod, lmrMod, murMod
+        """
+        chol = None if corr is None and cov is None else self.calcCholesky(std, corr, cov)
+        for start in range(0, nsims, chunksize):
+            yield self.sampleModel(min(chunksize, nsims - start), std, var, rng=rng, chol=chol)[1]
 
 
 class structAVOMod(object):
@@ -204,3 +680,264 @@ class structAVOMod(object):
                               self.topMod.RhoMod, self.botMod.RhoMod)
 
         # others to follow as required
+
+
+def calcLithProps(liths):
+    """
+    Collects the mean and standard deviation properties of a list of lithologies.
+    :param liths: list of structLith
+    :return: array (n_liths, 6) of Vp, Vs, Rho, VpStd, VsStd, RhoStd
+    """
+    return np.array([[lith.Vp, lith.Vs, lith.Rho, lith.VpStd, lith.VsStd, lith.RhoStd]
+                     for lith in liths], dtype=float)
+
+
+def calcLithCovariance(props, std, corr):
+    """
+    Covariance of Vp, Vs and Rho for each lithology from a correlation matrix.
+    :param props: array (n_liths, 6) from calcLithProps
+    :param std: number of standard deviations to model
+    :param corr: (3,3) or (n_liths,3,3) correlation matrix of Vp, Vs and Rho
+    :return: array (n_liths, 3, 3) of covariance matrices
+    """
+    sd = props[:, 3:6] * std
+    return sd[:, :, np.newaxis] * np.asarray(corr, dtype=float) * sd[:, np.newaxis, :]
+
+
+def calcLithCholesky(liths, std, corr):
+    """
+    Cholesky factors of the Vp, Vs, Rho covariance for a list of lithologies. Factors of
+    structLith objects come from their per lithology cache.
+    :param liths: list of structLith or array from calcLithProps
+    :param std: number of standard deviations to model
+    :param corr: (3,3) or (n_liths,3,3) correlation matrix of Vp, Vs and Rho
+    :return: array (n_liths, 3, 3) of lower Cholesky factors
+    """
+    if isinstance(liths, np.ndarray):
+        return np.linalg.cholesky(calcLithCovariance(liths, std, corr))
+    corr = np.broadcast_to(corr, (len(liths), 3, 3))
+    return np.array([lith.calcCholesky(std, corr[i]) for i, lith in enumerate(liths)])
+
+
+def calcModelProps(VpMod, VsMod, RhoMod):
+    """
+    Derived elastic properties of a set of stochastic Vp, Vs and Rho models.
+    :return: dict of VpMod, VsMod, RhoMod, AIMod, SIMod, VPVSMod, lmrMod, murMod
+    """
+    AIMod = VpMod * RhoMod
+    SIMod = VsMod * RhoMod
+    return dict(VpMod=VpMod, VsMod=VsMod, RhoMod=RhoMod, AIMod=AIMod, SIMod=SIMod,
+                VPVSMod=VpMod / VsMod, lmrMod=AIMod * AIMod - 2 * SIMod * SIMod,
+                murMod=SIMod * SIMod)
+
+
+def calcLithSample(props, nsims, std, var, rng=None, chol=None):
+    """
+    Draws the seeds and stochastic Vp, Vs and Rho models for a set of lithologies. This is
+    the one sampler behind structLith.calcModel, structLith.iterModel and calcLithModels.
+    :param props: array (n_liths, 6) from calcLithProps
+    :param nsims: number of simulations per lithology
+    :param std: number of standard deviations to model
+    :param var: variation allowed around the seed point
+    :keyword rng: numpy Generator to draw from, None uses the global np.random state
+    :keyword chol: (n_liths,3,3) lower Cholesky factors, None samples independently
+    :return: seed array (n_liths, nsims[, 3]), VpMod, VsMod, RhoMod arrays (n_liths, nsims)
+    """
+    if chol is not None:
+        shape = (len(props), nsims, 3)
+        seed = np.random.random(shape) if rng is None else rng.random(shape)
+        mod = calcRandMVNorm(props[:, 0:3], chol, seed, var, rng=rng)
+        return seed, mod[:, :, 0], mod[:, :, 1], mod[:, :, 2]
+    props = props[:, :, np.newaxis]
+    seed = np.random.rand(len(props), nsims) if rng is None else rng.random((len(props), nsims))
+    VpMod = calcRandNorm(props[:, 0], props[:, 3] * std, seed, var, rng=rng)
+    VsMod = calcRandNorm(props[:, 1], props[:, 4] * std, seed, var, rng=rng)
+    RhoMod = calcRandNorm(props[:, 2], props[:, 5] * std, seed, var, rng=rng)
+    return seed, VpMod, VsMod, RhoMod
+
+
+def calcLithModels(liths, nsims, std, var, rng=None, corr=None, chol=None):
+    """
+    Draws the stochastic Vp, Vs and Rho models for a list of lithologies in one pass.
+    Each lithology is sampled independently as in structLith.calcModel.
+    :param liths: list of structLith or array from calcLithProps
+    :param nsims: number of simulations per lithology
+    :param std: number of standard deviations to model
+    :param var: variation allowed around the seed point
+    :keyword rng: numpy Generator to draw from, None uses the global np.random state
+    :keyword corr: (3,3) or (n_liths,3,3) correlation of Vp, Vs and Rho, None samples them
+                   independently. All lithologies are drawn in one batched matrix multiply.
+    :keyword chol: (n_liths,3,3) precomputed Cholesky factors, used instead of corr
+    :return: VpMod, VsMod, RhoMod arrays (n_liths, nsims)
+    """
+    props = liths if isinstance(liths, np.ndarray) else calcLithProps(liths)
+    if chol is None and corr is not None:
+        chol = calcLithCholesky(liths, std, corr)
+    return calcLithSample(props, nsims, std, var, rng=rng, chol=chol)[1:]
+
+
+def calcAVOChunk(topprops, botprops, nsims, std, var, seedseq, topchol=None, botchol=None):
+    """
+    Draws and models one chunk of samples for every interface. This is the unit of work
+    distributed by structAVOBatch, it must stay a module level function to be picklable.
+    :param topprops, botprops: arrays from calcLithProps for the top and bottom lithologies
+    :param nsims: number of samples in the chunk
+    :param std: number of standard deviations to model
+    :param var: variation allowed around the seed point
+    :param seedseq: numpy SeedSequence for this chunk
+    :keyword topchol, botchol: Cholesky factors from calcLithCholesky for correlated sampling
+    :return: AVO model array (n_interfaces, nsims, 9)
+    """
+    rng = np.random.Generator(np.random.PCG64(seedseq))
+    tops = calcLithModels(topprops, nsims, std, var, rng=rng, chol=topchol)
+    bots = calcLithModels(botprops, nsims, std, var, rng=rng, chol=botchol)
+    return calcAVO(tops[0], bots[0], tops[1], bots[1], tops[2], bots[2])
+
+
+# a single interface of a structAVOBatch, compatible with the structAVOMod attributes used for plotting
+avoIntf = namedtuple('avoIntf', ['name', 'topName', 'botName', 'colour', 'AVOMod'])
+
+
+def iterAVOChunks(intfs, nsims, std, var, seed=None, chunksize=None, nworkers=1, corr=None):
+    """
+    Generator of stochastic AVO models for many interfaces in fixed size chunks of samples.
+    Each chunk draws from its own generator spawned from a SeedSequence, so the samples for a
+    given seed and chunksize are identical whatever the number of workers.
+    :param intfs: list of [top structLith, bottom structLith, colour] as in avoPyConfig.intfAr
+    :param nsims: total number of simulations per interface
+    :param std: number of standard deviations to model
+    :param var: variation allowed around the seed point
+    :keyword seed: entropy for the root SeedSequence, None draws fresh entropy
+    :keyword chunksize: number of samples per chunk, None is a single chunk of nsims
+    :keyword nworkers: number of worker processes, 1 runs the chunks in this process
+    :keyword corr: (3,3) correlation of Vp, Vs and Rho, None samples them independently
+    :return: yields start, AVO model array (n_interfaces, chunksize, 9)
+    """
+    seedseq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    chunksize = nsims if chunksize is None else chunksize
+    starts = list(range(0, nsims, chunksize))
+    seeds = seedseq.spawn(len(starts))
+    topprops = calcLithProps([intf[0] for intf in intfs])
+    botprops = calcLithProps([intf[1] for intf in intfs])
+    topchol = botchol = None
+    if corr is not None:
+        topchol = calcLithCholesky([intf[0] for intf in intfs], std, corr)
+        botchol = calcLithCholesky([intf[1] for intf in intfs], std, corr)
+
+    def chunkargs(i):
+        return topprops, botprops, min(chunksize, nsims - starts[i]), std, var, seeds[i], topchol, botchol
+
+    if nworkers == 1:
+        for i, start in enumerate(starts):
+            yield start, calcAVOChunk(*chunkargs(i))
+        return
+    # keep a bounded number of chunks in flight so memory does not grow with nsims
+    with ProcessPoolExecutor(max_workers=nworkers) as pool:
+        nsubmit = min(2*nworkers, len(starts))
+        pending = [pool.submit(calcAVOChunk, *chunkargs(i)) for i in range(nsubmit)]
+        for start in starts:
+            chunk = pending.pop(0).result()
+            if nsubmit < len(starts):
+                pending.append(pool.submit(calcAVOChunk, *chunkargs(nsubmit)))
+                nsubmit += 1
+            yield start, chunk
+
+
+class structAVOIntfs(object):
+    """
+    Interface names, colours and root SeedSequence shared by structAVOBatch and
+    structAVOStream.
+    """
+
+    def __init__(self, intfs, nsims, seed=None):
+        """
+        :param intfs: list of [top structLith, bottom structLith, colour] as in avoPyConfig.intfAr
+        :param nsims: number of simulations per interface
+        :keyword seed: entropy for the root SeedSequence, None draws fresh entropy
+        """
+        self.topNames = [intf[0].name for intf in intfs]
+        self.botNames = [intf[1].name for intf in intfs]
+        self.names = [top + " on " + bot for top, bot in zip(self.topNames, self.botNames)]
+        self.colours = [intf[2] for intf in intfs]
+        self.nsims = nsims
+
+        self.seedseq = np.random.SeedSequence(seed)
+        self.seed = self.seedseq.entropy   # keep the entropy so the run can be reproduced
+
+    def __len__(self):
+        return len(self.names)
+
+
+class structAVOBatch(structAVOIntfs):
+    """
+    Stochastic AVO models for many interfaces. Every interface is sampled and modelled
+    in vectorized chunks rather than one structAVOMod per interface.
+
+    Each chunk of samples draws from its own generator spawned from a SeedSequence, so the
+    result for a given seed and chunksize is identical whatever the number of workers.
+    """
+
+    def __init__(self, intfs, nsims, std, var, seed=None, chunksize=None, nworkers=1, corr=None):
+        """
+        :param intfs: list of [top structLith, bottom structLith, colour] as in avoPyConfig.intfAr
+        :param nsims: number of simulations per interface
+        :param std: number of standard deviations to model
+        :param var: variation allowed around the seed point
+        :keyword seed: entropy for the root SeedSequence, None draws fresh entropy
+        :keyword chunksize: number of samples per chunk, None is a single chunk of nsims
+        :keyword nworkers: number of worker processes, 1 runs the chunks in this process
+        :keyword corr: (3,3) correlation of Vp, Vs and Rho, None samples them independently
+        """
+        structAVOIntfs.__init__(self, intfs, nsims, seed)
+        self.chunksize = nsims if chunksize is None else chunksize
+        self.AVOMod = np.empty((len(intfs), nsims, 9))
+        for start, chunk in iterAVOChunks(intfs, nsims, std, var, seed=self.seedseq,
+                                          chunksize=self.chunksize, nworkers=nworkers, corr=corr):
+            self.AVOMod[:, start:start + chunk.shape[1]] = chunk
+
+    def __getitem__(self, i):
+        return avoIntf(self.names[i], self.topNames[i], self.botNames[i], self.colours[i], self.AVOMod[i])
+
+
+class structAVOStream(structAVOIntfs):
+    """
+    Summary statistics of stochastic AVO models for many interfaces. Samples are generated
+    in chunks by iterAVOChunks and folded into online accumulators, so memory does not
+    depend on nsims.
+    """
+
+    # AVOMod columns summarised, Rp of the Fatti form is the intercept A
+    statkeys = ['A', 'B', 'Rs']
+    statcols = [6, 7, 8]
+
+    def __init__(self, intfs, nsims, std, var, seed=None, chunksize=100000, nworkers=1,
+                 nbins=1024, quantiles=(0.1, 0.5, 0.9), corr=None):
+        """
+        :param intfs: list of [top structLith, bottom structLith, colour] as in avoPyConfig.intfAr
+        :param nsims: number of simulations per interface
+        :param std: number of standard deviations to model
+        :param var: variation allowed around the seed point
+        :keyword seed: entropy for the root SeedSequence, None draws fresh entropy
+        :keyword chunksize: number of samples per chunk
+        :keyword nworkers: number of worker processes, 1 runs the chunks in this process
+        :keyword nbins: number of histogram bins in the quantile sketch
+        :keyword quantiles: quantiles to report, default P10, P50, P90
+        :keyword corr: (3,3) correlation of Vp, Vs and Rho, None samples them independently
+        """
+        structAVOIntfs.__init__(self, intfs, nsims, seed)
+        self.stats = structStreamStats(len(intfs), len(self.statkeys), nbins=nbins, quantiles=quantiles)
+        for start, chunk in iterAVOChunks(intfs, nsims, std, var, seed=self.seedseq,
+                                          chunksize=chunksize, nworkers=nworkers, corr=corr):
+            self.stats.update(chunk[:, :, self.statcols])
+
+    def mean(self):
+        return self.stats.mean()
+
+    def var(self):
+        return self.stats.var()
+
+    def cov(self):
+        return self.stats.cov()
+
+    def quantiles(self):
+        return self.stats.quantiles()
@@ -0,0 +1,132 @@
+###############################################################################
+
+# Author: Antony Hallam
+# Company: HWU
+# Date: 18-10-2026
+
+# File Name: structRPT.py
+
+# Synopsis:
+# Rock physics templates over porosity x vclay x saturation x pressure grids.
+
+###############################################################################
+
+from data.structLith import structRockBatch
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+class structRPT(object):
+    """
+    Rock physics template of a rock and fluid evaluated on the grid of the porosity, vclay, water
+    saturation and current reservoir pressure axes. Axes broadcast against each other so the cube is
+    calculated in one structRockBatch pass, and only when a property is first requested. Sub-cubes
+    selected with isel/sel are calculated on their own axes or sliced from the parent if it has already
+    been calculated.
+    """
+
+    axisnames = ['phi', 'vclay', 'sw', 'pres']
+    props = ['velp', 'vels', 'den', 'pimp', 'vpvs']
+
+    def __init__(self, rock, fluid, pres, depth, phi, vclay, sw, curr_pres=None, hc='oil', c=None):
+        """
+        :param rock: mapping of the rock columns of the geoPy input files (phi and vclay are ignored)
+        :param fluid: mapping of the fluid columns of the geoPy input files (saturations are ignored)
+        :param pres: mapping of the pressure profile columns of the geoPy input files
+        :param depth: depth for calculation (meters TVDSS)
+        :param phi: porosity axis
+        :param vclay: vclay axis
+        :param sw: water saturation axis, the remaining pore space is filled with hc
+        :keyword curr_pres: current reservoir pressure axis (MPa), default pres['curr_Pres']
+        :keyword hc: hydrocarbon phase 'oil' or 'gas'
+        :keyword c: critical porosity vector, see structRockBatch
+        """
+        if hc not in ['oil', 'gas']:
+            raise ValueError("hc must be 'oil' or 'gas'")
+        self.rock = rock; self.fluid = fluid; self.pres = pres; self.depth = depth
+        self.hc = hc; self.c = c
+        curr_pres = pres['curr_Pres'] if curr_pres is None else curr_pres
+        self.axes = OrderedDict((name, np.atleast_1d(np.asarray(axis, dtype=float)))
+                                for name, axis in zip(self.axisnames, [phi, vclay, sw, curr_pres]))
+        self._cubes = dict()
+
+    @property
+    def shape(self):
+        return tuple(axis.size for axis in self.axes.values())
+
+    def grid(self, name):
+        """
+        :return: axis name reshaped to broadcast against the other axes
+        """
+        shape = [1]*len(self.axes); shape[self.axisnames.index(name)] = -1
+        return self.axes[name].reshape(shape)
+
+    def calc(self):
+        rock = dict((col, self.rock[col]) for col in structRockBatch.rockcols if col not in ['phi', 'vclay'])
+        rock['phi'] = self.grid('phi'); rock['vclay'] = self.grid('vclay')
+        fluid = dict((col, self.fluid[col]) for col in structRockBatch.fluidcols if col not in ['sw', 'so', 'sg'])
+        fluid['sw'] = self.grid('sw')
+        fluid['so'] = 1. - fluid['sw'] if self.hc == 'oil' else 0.
+        fluid['sg'] = 1. - fluid['sw'] if self.hc == 'gas' else 0.
+        pres = dict((col, self.pres[col]) for col in structRockBatch.prescols)
+        pres['curr_Pres'] = self.grid('pres')
+        batch = structRockBatch(rock, fluid, pres, self.depth, c=self.c)
+        for prop in self.props:
+            self._cubes[prop] = np.broadcast_to(getattr(batch, prop), self.shape)
+
+    def __getitem__(self, prop):
+        """
+        :param prop: one of props
+        :return: cube of prop with the shape of the axes
+        """
+        if prop not in self.props:
+            raise KeyError(prop)
+        if prop not in self._cubes:
+            self.calc()
+        return self._cubes[prop]
+
+    def isel(self, **indices):
+        """
+        Sub-template by axis index.
+        :param indices: axis name to int, slice or index array
+        :return: structRPT on the selected axes
+        """
+        sub = structRPT.__new__(structRPT)
+        sub.__dict__.update(self.__dict__)
+        sub.axes = OrderedDict(); sub._cubes = dict()
+        index = []
+        for name, axis in self.axes.items():
+            ind = np.arange(axis.size)[indices.pop(name, slice(None))]
+            sub.axes[name] = axis[np.atleast_1d(ind)]
+            index.append(np.atleast_1d(ind))
+        if indices:
+            raise KeyError('Unknown axes: %r' % list(indices))
+        for prop, cube in self._cubes.items():
+            sub._cubes[prop] = cube[np.ix_(*index)]
+        return sub
+
+    def sel(self, **values):
+        """
+        Sub-template by axis value, the nearest axis values are selected.
+        :param values: axis name to a value or sequence of values
+        :return: structRPT on the selected axes
+        """
+        indices = dict()
+        for name, val in values.items():
+            if name not in self.axes:
+                raise KeyError('Unknown axes: %r' % name)
+            indices[name] = np.abs(self.axes[name][:, np.newaxis] - np.atleast_1d(val)).argmin(axis=0)
+        return self.isel(**indices)
+
+    def toDataFrame(self, props=None):
+        """
+        :keyword props: properties to include, default props
+        :return: pandas DataFrame with a row per grid node, e.g. for a bokeh ColumnDataSource
+        """
+        props = self.props if props is None else props
+        mesh = np.meshgrid(*self.axes.values(), indexing='ij')
+        data = OrderedDict((name, m.ravel()) for name, m in zip(self.axisnames, mesh))
+        for prop in props:
+            data[prop] = self[prop].ravel()
+        return pd.DataFrame(data)
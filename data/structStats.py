@@ -0,0 +1,115 @@
+###############################################################################
+
+# Author: Antony Hallam
+# Company: HWU
+# Date: 18-10-2026
+
+# File Name: structStats.py
+
+# Synopsis:
+# Online accumulators for summarising stochastic models in chunks.
+
+###############################################################################
+
+import numpy as np
+
+
+class structStreamStats(object):
+    """
+    Streaming mean, covariance and quantiles of ngroup independent sets of nvar variables.
+    Moments are merged chunk by chunk (Chan et al.) and quantiles come from a fixed size
+    histogram sketch whose range grows by doubling, so memory is independent of the number
+    of samples. Quantile error is bounded by the histogram bin width.
+    """
+
+    def __init__(self, ngroup, nvar, nbins=1024, quantiles=(0.1, 0.5, 0.9)):
+        """
+        :param ngroup: number of groups (e.g. interfaces)
+        :param nvar: number of variables per group
+        :keyword nbins: number of histogram bins, must be a power of 2
+        :keyword quantiles: quantiles to report
+        """
+        if nbins & (nbins - 1):
+            raise ValueError('nbins must be a power of 2')
+        self.ngroup = ngroup; self.nvar = nvar
+        self.nbins = nbins
+        self.q = np.asarray(quantiles, dtype=float)
+        self.n = 0
+        self.mu = np.zeros((ngroup, nvar))
+        self.C = np.zeros((ngroup, nvar, nvar))
+        self.counts = np.zeros((ngroup * nvar, nbins))
+        self.lo = None; self.width = None    # histogram range per series
+
+    def update(self, x):
+        """
+        Folds a chunk of samples into the accumulators.
+        :param x: array (ngroup, nsamples, nvar)
+        """
+        nb = x.shape[1]
+        if nb == 0:
+            return
+        mub = x.mean(axis=1)
+        xc = x - mub[:, np.newaxis, :]
+        Cb = np.einsum('gni,gnj->gij', xc, xc)
+        n = self.n + nb
+        delta = mub - self.mu
+        self.mu += delta * nb / n
+        self.C += Cb + delta[:, :, np.newaxis] * delta[:, np.newaxis, :] * self.n * nb / n
+        self.n = n
+        self._updateHist(np.moveaxis(x, 1, 2).reshape(self.ngroup * self.nvar, nb))
+
+    def _updateHist(self, xs):
+        xmin = xs.min(axis=1); xmax = xs.max(axis=1)
+        if self.lo is None:
+            span = xmax - xmin
+            span = np.where(span > 0, span, np.maximum(np.abs(xmax), 1.0) * 1e-6)
+            self.lo = xmin - 0.05 * span
+            self.width = 1.1 * span
+        for i in np.nonzero((xmin < self.lo) | (xmax >= self.lo + self.width))[0]:
+            self._growRange(i, xmin[i], xmax[i])
+        idx = np.floor((xs - self.lo[:, np.newaxis]) / self.width[:, np.newaxis] * self.nbins)
+        idx = np.clip(idx, 0, self.nbins - 1).astype(np.intp)
+        idx += np.arange(xs.shape[0])[:, np.newaxis] * self.nbins
+        self.counts += np.bincount(idx.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def _growRange(self, i, xmin, xmax):
+        # double the range until the samples fit, merging bin pairs to keep nbins fixed
+        while xmin < self.lo[i] or xmax >= self.lo[i] + self.width[i]:
+            merged = self.counts[i].reshape(-1, 2).sum(axis=1)
+            if xmin < self.lo[i]:
+                self.counts[i] = np.concatenate([np.zeros(merged.size), merged])
+                self.lo[i] -= self.width[i]
+            else:
+                self.counts[i] = np.concatenate([merged, np.zeros(merged.size)])
+            self.width[i] *= 2
+
+    def mean(self):
+        """
+        :return: mean array (ngroup, nvar)
+        """
+        return self.mu.copy()
+
+    def cov(self):
+        """
+        :return: sample covariance array (ngroup, nvar, nvar)
+        """
+        return self.C / (self.n - 1)
+
+    def var(self):
+        """
+        :return: sample variance array (ngroup, nvar)
+        """
+        return np.diagonal(self.cov(), axis1=1, axis2=2).copy()
+
+    def quantiles(self):
+        """
+        :return: quantile array (ngroup, nvar, nquantiles) interpolated within histogram bins
+        """
+        cdf = np.cumsum(self.counts, axis=1) / self.n
+        cdf = np.concatenate([np.zeros((cdf.shape[0], 1)), cdf], axis=1)
+        out = np.empty((cdf.shape[0], self.q.size))
+        for i in range(cdf.shape[0]):
+            edges = self.lo[i] + self.width[i] * np.arange(self.nbins + 1) / self.nbins
+            keep = np.concatenate([[True], np.diff(cdf[i]) > 0])   # drop flat steps of empty bins
+            out[i] = np.interp(self.q, cdf[i][keep], edges[keep])
+        return out.reshape(self.ngroup, self.nvar, self.q.size)
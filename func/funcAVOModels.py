@@ -12,9 +12,76 @@
 ###############################################################################
 
 import numpy as np
-import scipy.stats as sps
 
-def calcRandNorm(mean,std,seed,var):
+# rational approximation coefficients for the inverse normal CDF (Acklam, 2003)
+_ppf_a = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+          1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+_ppf_b = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+          6.680131188771972e+01, -1.328068155288572e+01, 1.0]
+_ppf_c = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+          -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+_ppf_d = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+          3.754408661907416e+00, 1.0]
+_ppf_plow = 0.02425
+
+def calcNormPPF(p, out=None, block=8192):
+    """
+    Inverse of the standard normal CDF using Acklam's rational approximation
+    (relative error < 1.15e-9). A lightweight replacement for scipy.stats.norm.ppf.
+    Large arrays are evaluated in blocks which stay in cache between the Horner steps.
+
+    input:
+            p     : probabilities in the open interval (0,1)
+            out   : array the shape of p for the result, may be p itself
+            block : number of elements evaluated at a time
+
+    output:
+            standard normal deviates with the same shape as p
+"""
+    p = np.asarray(p, dtype=float)
+    out = np.empty_like(p) if out is None else out
+    pf = p.reshape(-1); of = out.reshape(-1)
+    q = np.empty(min(block, pf.size)); r = np.empty_like(q); den = np.empty_like(q)
+    for i in range(0, pf.size, block):
+        pb = pf[i:i+block]; n = pb.size
+        qb = q[:n]; rb = r[:n]; db = den[:n]; x = of[i:i+block]
+        np.subtract(pb, 0.5, out=qb); np.multiply(qb, qb, out=rb)
+        # horner evaluation in place to avoid temporaries
+        x.fill(_ppf_a[0])
+        for coef in _ppf_a[1:]:
+            x *= rb; x += coef
+        db.fill(_ppf_b[0])
+        for coef in _ppf_b[1:]:
+            db *= rb; db += coef
+        x *= qb; x /= db
+        tail = np.abs(qb) > 0.5 - _ppf_plow
+        if np.any(tail):
+            qt = qb[tail]
+            qt = np.sqrt(-2.0*np.log(0.5 - np.abs(qt)))
+            xt = np.polyval(_ppf_c, qt)/np.polyval(_ppf_d, qt)
+            x[tail] = np.where(qb[tail] < 0, xt, -xt)
+    return out
+
+def calcSeedWindow(seed,var,rng=None):
+    """
+    Draws a probability in the window seed*(1+2*var*random) above each seed point, clipped to
+    0.01-0.99. Shared by calcRandNorm and calcRandMVNorm, evaluated in place on one array.
+
+    input:
+            seed : seed points on the distribution
+            var  : variation allowed around seed point in %
+            rng  : numpy Generator to draw from, None uses the global np.random state
+
+    output:
+            array of probabilities the shape of seed (or 1 for a scalar seed)
+"""
+    random = np.random.random if rng is None else rng.random
+    val = random(size=np.shape(seed) or 1)
+    val *= 2.0*var; val += 1.0; val *= seed
+    np.clip(val,0.01,0.99,out=val)
+    return val
+
+def calcRandNorm(mean,std,seed,var,rng=None,dist='norm'):
     """
     Calculates a random value from the mean & standard deviation for a normal
     distribution. Seed is used to set the point on the lognormal curve 0-100% 
@@ -25,16 +92,51 @@ def calcRandNorm(mean,std,seed,var):
             std  : standard deviation of distribution
             seed : seed point on random distribution (generally a random number)
             var  : variation allowed around seed point in %
+            rng  : numpy Generator to draw from, None uses the global np.random state
+            dist : 'norm' for a normal or 'lognorm' for a lognormal distribution
+                   with the given mean and standard deviation
 
     output:
             new semi random value which meets input criteria
 """
 
-    varR = (seed*(1.0+var)-seed*(1.0-var))
-    val   = np.random.random(size=np.size(varR))*varR+seed
-    np.clip(val,0.01,0.99,out=val)
-    val = sps.norm.ppf(val,loc=mean,scale=std)
+    if dist not in ['norm', 'lognorm']:
+        raise KeyError(dist)
+    val = calcSeedWindow(seed, var, rng=rng)
+    calcNormPPF(val, out=val)
+    if dist == 'lognorm':
+        sigma2 = np.log(1.0 + (std/mean)**2)
+        mean, std = np.log(mean) - 0.5*sigma2, np.sqrt(sigma2)
+    if np.broadcast(val, mean, std).shape == val.shape:
+        val *= std; val += mean
+    else:  # mean or std have more samples than seed
+        val = mean + std*val
+    if dist == 'lognorm':
+        np.exp(val, out=val)
     return val
+
+def calcRandMVNorm(mean,chol,seed,var,rng=None):
+    """
+    Calculates correlated random values of several properties from a multivariate normal
+    distribution. The seed windowing is the same as calcRandNorm, the windowed deviates of
+    each property are then correlated by the Cholesky factor of the covariance in one
+    batched matrix multiply. Each property needs its own seed, a seed shared between
+    properties would correlate them before the Cholesky factor is applied.
+
+    input:
+            mean : array (..., nprop) of property means
+            chol : array (..., nprop, nprop) lower Cholesky factor of the covariance
+            seed : array (..., nsims, nprop) seed points on the distribution
+            var  : variation allowed around seed point in %
+            rng  : numpy Generator to draw from, None uses the global np.random state
+
+    output:
+            array (..., nsims, nprop) of semi random values
+"""
+    mean = np.asarray(mean, dtype=float); chol = np.asarray(chol, dtype=float)
+    val = calcSeedWindow(np.asarray(seed, dtype=float), var, rng=rng)
+    calcNormPPF(val, out=val)
+    return mean[..., np.newaxis, :] + np.matmul(val, np.swapaxes(chol, -1, -2))
     
 def modelAVOAkiRichards3(interface):
     """
@@ -46,19 +148,19 @@ def modelAVOAkiRichards3(interface):
     
     
     """
-    interface[:,6]=0.5*(interface[:,0]/interface[:,3]+ \
-                        interface[:,2]/interface[:,5])
-    interface[:,7]=(interface[:,0]/(2*interface[:,3]))- \
-                        4*((interface[:,4]**2/interface[:,3]**2)* \
-                        (interface[:,1]/interface[:,4]))- \
-                        2*(interface[:,4]**2/interface[:,3]**2)* \
-                        (interface[:,2]/interface[:,5])
+    interface[...,6]=0.5*(interface[...,0]/interface[...,3]+ \
+                        interface[...,2]/interface[...,5])
+    interface[...,7]=(interface[...,0]/(2*interface[...,3]))- \
+                        4*((interface[...,4]**2/interface[...,3]**2)* \
+                        (interface[...,1]/interface[...,4]))- \
+                        2*(interface[...,4]**2/interface[...,3]**2)* \
+                        (interface[...,2]/interface[...,5])
                         
 def modelFattiRpRs(interface,vpvs=0.5):
     """
     Calculates the Rs Term for the fatti equation.
     """
-    interface[:,8]=vpvs*(interface[:,6]-interface[:,7])
+    interface[...,8]=vpvs*(interface[...,6]-interface[...,7])
 
 def calcAVO(velp1,velp2,vels1,vels2,rho1,rho2,model='akirichards3'):
     """
@@ -71,23 +173,77 @@ def calcAVO(velp1,velp2,vels1,vels2,rho1,rho2,model='akirichards3'):
             vels2 : Bottom halfspace S-wave Velocity
             rho1  : Top halfspace Density
             rho2  : Bottom halfspace Density
+            Inputs may be arrays of any shape which broadcast together,
+            e.g. (n_interfaces, nsims).
             
     output:
-            array of accoustic properties
+            array of accoustic properties with a trailing axis of 9
             dVp,dVs,dRho,Vp,Vs,Rho,A,B,Rp,Rs
 
     
     """
-    out=np.zeros([np.size(velp1),9])
-    out[:,0]=velp2-velp1
-    out[:,1]=vels2-vels1
-    out[:,2]=rho2-rho1
-    out[:,3]=(velp2+velp1)/2.0
-    out[:,4]=(vels2+vels1)/2.0
-    out[:,5]=(rho2+rho1)/2.0
+    shape=np.broadcast(velp1,velp2,vels1,vels2,rho1,rho2).shape or (1,)
+    out=np.zeros(shape+(9,))
+    out[...,0]=velp2-velp1
+    out[...,1]=vels2-vels1
+    out[...,2]=rho2-rho1
+    out[...,3]=(velp2+velp1)/2.0
+    out[...,4]=(vels2+vels1)/2.0
+    out[...,5]=(rho2+rho1)/2.0
     modelAVOAkiRichards3(out)
     modelFattiRpRs(out)
     return out
 
 #class blockLithology(self):
-    
+
+if __name__ == "__main__":
+    from timeit import timeit
+    from tests import test_title_msg, test_msg
+
+    test_title_msg('calcNormPPF')
+    import scipy.stats as sps
+    p = np.linspace(0.0001, 0.9999, 10001)
+    test_msg('calcNormPPF','against scipy.stats.norm.ppf',np.allclose(calcNormPPF(p),sps.norm.ppf(p),
+                                                                     rtol=1e-8,atol=1e-8),True)
+
+    test_title_msg('calcRandNorm')
+    nsims = 1000000
+    seed = np.random.rand(nsims)
+    act_norm = calcRandNorm(3660,135,seed,0.05,rng=np.random.default_rng(1))
+    qcr_norm = sps.norm.ppf(np.clip(np.random.default_rng(1).random(nsims)*seed*0.1+seed,0.01,0.99),
+                            loc=3660,scale=135)
+    test_msg('calcRandNorm','matches scipy.stats windowing',np.allclose(act_norm,qcr_norm),True)
+    act_lognorm = calcRandNorm(2.4,0.1,np.random.rand(nsims),1.0,dist='lognorm')
+    test_msg('calcRandNorm','lognorm is positive',bool(np.all(act_lognorm > 0)),True)
+
+    test_title_msg('calcRandMVNorm')
+    qcr_corr = np.array([[1.0, 0.8, 0.5], [0.8, 1.0, 0.3], [0.5, 0.3, 1.0]])
+    qcr_std = np.array([135.0, 87.0, 0.03])
+    chol = np.linalg.cholesky(qcr_std[:, np.newaxis]*qcr_corr*qcr_std[np.newaxis, :])
+    act_mv = calcRandMVNorm([3418.0, 1753.0, 2.51], chol, np.random.rand(nsims, 3), 0.05)
+    test_msg('calcRandMVNorm','output shape',act_mv.shape,(nsims, 3))
+    test_msg('calcRandMVNorm','correlation',np.allclose(np.corrcoef(act_mv.T),qcr_corr,atol=0.02),True)
+
+    # benchmark against the previous scipy.stats implementation
+    t_new = timeit(lambda: calcRandNorm(3660,135,seed,0.05), number=5)/5
+    t_old = timeit(lambda: sps.norm.ppf(np.clip(np.random.random(nsims)*seed*0.1+seed,0.01,0.99),
+                                        loc=3660,scale=135), number=5)/5
+    print('benchmark: calcRandNorm nsims=%d  scipy.stats %.1f ms  calcNormPPF %.1f ms  speedup x%.1f'
+          % (nsims, t_old*1000, t_new*1000, t_old/t_new))
+
+    # import time in a fresh interpreter, the previous implementation also imported scipy.stats
+    import subprocess, sys, time
+    from os.path import dirname, abspath
+    def importtime(stmt, number=3):
+        times = []
+        for i in range(number):
+            t0 = time.perf_counter()
+            subprocess.check_call([sys.executable, '-c', stmt], cwd=dirname(dirname(abspath(__file__))))
+            times.append(time.perf_counter() - t0)
+        return min(times)
+    imp_new = importtime('import func.funcAVOModels')
+    imp_old = importtime('import func.funcAVOModels, scipy.stats')
+    print('benchmark: import funcAVOModels  with scipy.stats %.0f ms  without %.0f ms  speedup x%.1f'
+          % (imp_old*1000, imp_new*1000, imp_old/imp_new))
+    print('benchmark: import and first calcRandNorm nsims=%d  with scipy.stats %.0f ms  without %.0f ms  speedup x%.1f'
+          % (nsims, (imp_old + t_old)*1000, (imp_new + t_new)*1000, (imp_old + t_old)/(imp_new + t_new)))
@@ -12,6 +12,7 @@
 ###############################################################################
 
 import numpy as np
+from functools import lru_cache
 
 def calcModVRH(fshale, shalemod, fnonshale, nonshalemod):
     '''
@@ -30,20 +31,22 @@ def calcModVRH(fshale, shalemod, fnonshale, nonshalemod):
 def calcDryFrame_dPres(erp_init,erp,mod_vrh,mod_E,mod_P,phi,c=[40,0,40,0,15]):
     """
     Calculates the dry rock frame for a given stress regieme and depth.
+    All inputs may be arrays which broadcast together, critical porosity is chosen element-wise
+    so porosity/pressure logs and grids are evaluated in one call.
     :param erp_init: Effective Initial Reservoir Pressure (MPa) = Overburden Pressure - Initial Reservoir Pressure
     :param erp: Effective Current Reservoir Pressure (MPa) = Overburden Pressure - Current Reservoir Pressure
     :param mod_vrh: Voigt-Reuss mix for modulus (check this).
     :param mod_E: modulus stress sensitivity metric *2
     :param mod_P: modulus characteristic pressure constant *2
     :param phi: rock porosity
-    :param c: critical porosity vector *1
+    :param c: critical porosity vector *1, each element may be an array
     :return moddry: the dry-frame modulus for inputs
 
     References:
     [1] Amini and Alvarez (2014)
     [2] MacBeth (2004)
     """
-    critphi = (c[0] + c[2]*phi) if phi <= c[4] else (c[2] + c[3]*phi)     #check critial porosity
+    critphi = np.where(phi <= c[4], c[0] + c[2]*phi, c[2] + c[3]*phi)     #check critial porosity
     #Calcuate Bulk Modulus for Dry Frame
     dry1 = mod_vrh * (1 - phi / critphi)
     moddry = dry1 * (1 + (mod_E * np.exp(-erp_init / mod_P))) / (1 + (mod_E * np.exp(-erp / mod_P)))
@@ -61,16 +64,18 @@ def gassmann_dry2fluid(Kdry, K_vrh, Kfluid, phi):
 
 def mixfluid(water,oil,gas):
     '''
-    Mixes three phase in the reservoir to calculate bulk modulus & density.
+    Mixes three phase in the reservoir to calculate bulk modulus (Wood/Reuss) & density.
+    Each property may be a scalar or an array, the outputs are broadcast over all inputs
+    so whole saturation meshes can be mixed in one call.
     :param water: list of length 3 bulkModulus, density, saturation
     :param oil: list of length 3 bulkModulus, density, saturation
     :param gas: list of length 3 bulkModulus, density, saturation
-    :return:
+    :return: K, rho
     '''
-    group = np.array([water,oil,gas])
-    K =  1 / sum(group[:,2]/group[:,0]) #  k = 1 / (sum ( sat_i/k_i ))
-    rho = sum(group[:,2]*group[:,1]) # rho = sum (sat_i*rho_i)
-    #print('krho',K,rho)
+    (kw, rhow, sw), (ko, rhoo, so), (kg, rhog, sg) = \
+        [[np.asarray(prop, dtype=float) for prop in phase] for phase in (water, oil, gas)]
+    K = 1 / (sw/kw + so/ko + sg/kg) #  k = 1 / (sum ( sat_i/k_i ))
+    rho = sw*rhow + so*rhoo + sg*rhog # rho = sum (sat_i*rho_i)
     return K, rho
 
 def calcVels(mu,rho):
@@ -90,4 +95,118 @@ def calcVelp(K,mu,rho):
     :param rho: The material density
     :return: The pressure wave velocity
     '''
-    return np.sqrt((K + (4 / 3) * mu) / rho)
\ No newline at end of file
+    return np.sqrt((K + (4 / 3) * mu) / rho)
+
+# Batzle and Wang (1992) brine velocity coefficients w[i][j] for T**i * P**j
+_bw_brine_w = np.array([[1402.85, 1.524, 3.437e-3, -1.197e-5],
+                        [4.871, -0.0111, 1.739e-4, -1.628e-6],
+                        [-0.04783, 2.747e-4, -2.135e-6, 1.237e-8],
+                        [1.487e-4, -6.503e-7, -1.455e-8, 1.327e-10],
+                        [-2.197e-7, 7.987e-10, 5.230e-11, -4.614e-13]])
+
+def calcBWBrine(pres, temp, sal):
+    '''
+    Brine bulk modulus and density from Batzle and Wang (1992).
+    :param pres: pore pressure (MPa)
+    :param temp: temperature (degC)
+    :param sal: salinity (weight fraction, ppm/1e6)
+    :return: K (GPa), rho (g/cc)
+    '''
+    P, T, S = [np.asarray(var, dtype=float) for var in (pres, temp, sal)]
+    rhow = 1 + 1e-6*(-80*T - 3.3*T**2 + 0.00175*T**3 + 489*P - 2*T*P + 0.016*T**2*P
+                     - 1.3e-5*T**3*P - 0.333*P**2 - 0.002*T*P**2)
+    rho = rhow + S*(0.668 + 0.44*S + 1e-6*(300*P - 2400*P*S + T*(80 + 3*T - 3300*S - 13*P + 47*P*S)))
+    velw = sum(_bw_brine_w[i, j] * T**i * P**j for i in range(5) for j in range(4))
+    vel = velw + S*(1170 - 9.6*T + 0.055*T**2 - 8.5e-5*T**3 + 2.6*P - 0.0029*T*P - 0.0476*P**2) \
+          + S**1.5*(780 - 10*P + 0.16*P**2) - 1820*S**2
+    return rho*(vel/1000.)**2, rho
+
+def calcBWDeadOil(pres, temp, api):
+    '''
+    Dead (gas free) oil bulk modulus and density from Batzle and Wang (1992).
+    :param pres: pore pressure (MPa)
+    :param temp: temperature (degC)
+    :param api: oil gravity (API)
+    :return: K (GPa), rho (g/cc)
+    '''
+    P, T, API = [np.asarray(var, dtype=float) for var in (pres, temp, api)]
+    rho0 = 141.5 / (API + 131.5)
+    rhop = rho0 + (0.00277*P - 1.71e-7*P**3)*(rho0 - 1.15)**2 + 3.49e-4*P
+    rho = rhop / (0.972 + 3.81e-4*(T + 17.78)**1.175)
+    vel = 15450*(77.1 + API)**-0.5 - 3.7*T + 4.64*P + 0.0115*(0.36*API**0.5 - 1)*T*P
+    return rho*(vel/1000.)**2, rho
+
+def calcBWGas(pres, temp, grav):
+    '''
+    Gas bulk modulus and density from Batzle and Wang (1992).
+    :param pres: pore pressure (MPa)
+    :param temp: temperature (degC)
+    :param grav: gas specific gravity (air = 1)
+    :return: K (GPa), rho (g/cc)
+    '''
+    P, T, G = [np.asarray(var, dtype=float) for var in (pres, temp, grav)]
+    Ta = T + 273.15
+    Tpr = Ta / (94.72 + 170.75*G)   # pseudo-reduced temperature and pressure
+    Ppr = P / (4.892 - 0.4048*G)
+    a = 0.03 + 0.00527*(3.5 - Tpr)**3
+    b = 0.642*Tpr - 0.007*Tpr**4 - 0.52
+    d = 0.45 + 8*(0.56 - 1/Tpr)**2
+    E = 0.109*(3.85 - Tpr)**2 * np.exp(-d*Ppr**1.2/Tpr)
+    Z = a*Ppr + b + E
+    dZdPpr = a - E*1.2*d*Ppr**0.2/Tpr
+    rho = 28.8*G*P / (Z*8.31441*Ta)
+    gamma0 = 0.85 + 5.6/(Ppr + 2) + 27.1/(Ppr + 3.5)**2 - 8.7*np.exp(-0.65*(Ppr + 1))
+    K = P*gamma0 / (1 - Ppr/Z*dZdPpr) / 1000.
+    return K, rho
+
+bwphases = {'water': calcBWBrine, 'oil': calcBWDeadOil, 'gas': calcBWGas}
+
+@lru_cache(maxsize=64)
+def calcBWTable(phase, temp, param, presmin=0.1, presmax=100., npres=1000):
+    '''
+    Cached pressure table of a Batzle and Wang phase at constant temperature.
+    :param phase: 'water', 'oil' or 'gas'
+    :param temp: temperature (degC)
+    :param param: salinity (water), API (oil) or gas gravity (gas)
+    :return: pres, K, rho vectors
+    '''
+    pres = np.linspace(presmin, presmax, npres)
+    K, rho = bwphases[phase](pres, temp, param)
+    return pres, K, rho
+
+def calcBWInterp(phase, pres, temp, param):
+    '''
+    Batzle and Wang phase properties interpolated from the cached table, pres may be any array.
+    :return: K (GPa), rho (g/cc)
+    '''
+    tpres, tK, trho = calcBWTable(phase, float(temp), float(param))
+    return np.interp(pres, tpres, tK), np.interp(pres, tpres, trho)
+
+def calcBWFluids(pres, pvt):
+    '''
+    Interpolated water, oil and gas properties for mixfluid.
+    :param pres: pore pressure (MPa), scalar or array
+    :param pvt: dict of temp (degC), sal (weight fraction), api and grav (gas gravity)
+    :return: [kw, rhow], [ko, rhoo], [kg, rhog]
+    '''
+    return [list(calcBWInterp(phase, pres, pvt['temp'], pvt[param]))
+            for phase, param in [('water', 'sal'), ('oil', 'api'), ('gas', 'grav')]]
+
+if __name__ == "__main__":
+    from tests import test_msg, test_title_msg
+
+    test_title_msg('Batzle-Wang')
+    K, rho = calcBWBrine(0.1, 20, 0)
+    test_msg('calcBWBrine', 'fresh water velocity (m/s)', np.round(1000*np.sqrt(K/rho)), 1482.0)
+    test_msg('calcBWBrine', 'fresh water density', np.round(rho, 2), 1.0)
+    K, rho = calcBWBrine(30, 80, 0.05)
+    test_msg('calcBWBrine', 'brine at reservoir conditions', (2.5 < K < 3.2, 1.0 < rho < 1.05), (True, True))
+    K, rho = calcBWDeadOil(30, 80, 35)
+    test_msg('calcBWDeadOil', 'oil at reservoir conditions', (0.8 < K < 1.6, 0.75 < rho < 0.85), (True, True))
+    K, rho = calcBWGas(30, 80, 0.65)
+    test_msg('calcBWGas', 'gas at reservoir conditions', (0.03 < K < 0.15, 0.15 < rho < 0.3), (True, True))
+    pres = np.linspace(5, 50, 7)
+    test_msg('calcBWInterp', 'table matches correlation', np.allclose(calcBWInterp('gas', pres, 80, 0.65)[0],
+                                                                      calcBWGas(pres, 80, 0.65)[0], rtol=1e-3), True)
+    calcBWInterp('gas', pres, 80, 0.65)
+    test_msg('calcBWTable', 'cached', calcBWTable.cache_info().hits >= 1, True)
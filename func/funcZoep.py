@@ -12,14 +12,18 @@
 ###############################################################################
 
 from numpy import sin, arcsin, cos, arccos, tan, degrees, radians, \
-                  array, matmul, linalg, vectorize
+                  linalg, vectorize
+import numpy as np
+from functools import lru_cache
 
-def snellrr(thetai, vp1, vs1, vp2, vs2, units='radians'):
+def snellrr(thetai, vp1, vs1, vp2, vs2, units='radians', cmplx=False):
     '''
     Returns the reflected and refracted angles of an incident P-wave ray.
     :param thetai: P-wave angle of incidence for wavefront
     :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces
     :keyword units: radians or degrees or deg2rad or rad2deg
+    :keyword cmplx: if True the angles are complex so post-critical angles do not return NaN,
+                    only radians or deg2rad output is supported.
     :return: returns a list of calculated angles using Snell's Law
                     thetai = input angle of P-wave incidence and output angle P-wave reflection
                     thetat = output angle of P-wave transmission
@@ -32,9 +36,15 @@ def snellrr(thetai, vp1, vs1, vp2, vs2, units='radians'):
         out = [thetai,0,0,0]
     else:
         raise KeyError
-    out[1] = arcsin((vp2*sin(out[0]))/vp1)
-    out[2] = arcsin((vs1*sin(out[0]))/vp1)
-    out[3] = arcsin((vs2*sin(out[0]))/vp1)
+    if cmplx:
+        if units in ['degrees','rad2deg']:
+            raise KeyError
+        asin = lambda x: arcsin(np.asarray(x, dtype=complex))
+    else:
+        asin = arcsin
+    out[1] = asin((vp2*sin(out[0]))/vp1)
+    out[2] = asin((vs1*sin(out[0]))/vp1)
+    out[3] = asin((vs2*sin(out[0]))/vp1)
     if units in ['degrees','rad2deg']:
         return degrees(out).tolist()
     else:
@@ -49,6 +59,19 @@ def zoeppritzfull(thetai,vp1,vs1,rho1,vp2,vs2,rho2):
     :param rho1, rho2: densities for 2 halfspaces
     :return: list [Rp, Rs, Tp, Ts] of amplitudes for reflected and transmitted rays
     '''
+    return zoeppritzfullStack(thetai,vp1,vs1,rho1,vp2,vs2,rho2)[:,0,0].tolist()
+
+def zoeppritzfullStack(theta,vp1,vs1,rho1,vp2,vs2,rho2):
+    '''
+    Calculates the solution to the full Zoeppritz Matrix for every angle/interface pair.
+    The (n_interfaces, n_angles, 4, 4) matrix stack is solved with a single call to
+    linalg.solve.
+    :param theta: P-wave angles of incidence in radians (n_angles)
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces (n_interfaces)
+    :param rho1, rho2: densities for 2 halfspaces (n_interfaces)
+    :return: contiguous array (4, n_interfaces, n_angles) of [Rp, Rs, Tp, Ts]
+    '''
+    thetai, vp1, vs1, rho1, vp2, vs2, rho2 = broadcastintf(theta,vp1,vs1,rho1,vp2,vs2,rho2)
     ang = snellrr(thetai, vp1, vs1, vp2, vs2)
     c1 = vp1/vs1
     c2 = (rho2*vs2*vs2*vp1)/(rho1*vs1*vs1*vp2)
@@ -56,22 +79,31 @@ def zoeppritzfull(thetai,vp1,vs1,rho1,vp2,vs2,rho2):
     c4 = 1/c1
     c5 = (rho2*vp2)/(rho1*vp1)
     c6 = -1*(rho2*vs2)/(rho1*vp1)
-    B = array([sin(thetai), cos(thetai), sin(2*thetai), cos(2*ang[2])])
-    A = array([[  -sin(thetai),     -cos(ang[2]),      sin(ang[1]),      cos(ang[3])],
-               [   cos(thetai),     -sin(ang[2]),      cos(ang[1]),     -sin(ang[3])],
-               [ sin(2*thetai), c1*cos(2*ang[2]), c2*cos(2*ang[2]), c3*cos(2*ang[3])],
-               [-cos(2*ang[2]), c4*sin(2*ang[2]), c5*cos(2*ang[3]), c6*sin(2*ang[3])]])
-    return matmul(linalg.inv(A),B).tolist()
+    shape = np.broadcast(thetai, vp1).shape
+    B = np.empty(shape + (4, 1))
+    B[..., 0, 0] = sin(thetai); B[..., 1, 0] = cos(thetai)
+    B[..., 2, 0] = sin(2*thetai); B[..., 3, 0] = cos(2*ang[2])
+    A = np.empty(shape + (4, 4))
+    A[..., 0, 0] = -sin(thetai);    A[..., 0, 1] = -cos(ang[2])
+    A[..., 0, 2] = sin(ang[1]);     A[..., 0, 3] = cos(ang[3])
+    A[..., 1, 0] = cos(thetai);     A[..., 1, 1] = -sin(ang[2])
+    A[..., 1, 2] = cos(ang[1]);     A[..., 1, 3] = -sin(ang[3])
+    A[..., 2, 0] = sin(2*thetai);   A[..., 2, 1] = c1*cos(2*ang[2])
+    A[..., 2, 2] = c2*cos(2*ang[2]); A[..., 2, 3] = c3*cos(2*ang[3])
+    A[..., 3, 0] = -cos(2*ang[2]);  A[..., 3, 1] = c4*sin(2*ang[2])
+    A[..., 3, 2] = c5*cos(2*ang[3]); A[..., 3, 3] = c6*sin(2*ang[3])
+    return np.ascontiguousarray(np.moveaxis(linalg.solve(A, B)[..., 0], -1, 0))
 
-def zoeppritzPray(thetai,vp1,vs1,rho1,vp2,vs2,rho2):
+def zoeppritzPray(thetai,vp1,vs1,rho1,vp2,vs2,rho2,cmplx=False):
     '''
     Calculates the solution to an incident down-going P-wave ray.
     :param thetai: P-wave angle of incidence for wavefront in radians
     :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces
     :param rho1, rho2: densities for 2 halfspaces
+    :keyword cmplx: if True returns complex coefficients which remain valid past the critical angle
     :return: list [Rp, Rs, Tp, Ts] of amplitudes for reflected and transmitted rays
     '''
-    ang = snellrr(thetai, vp1, vs1, vp2, vs2)
+    ang = snellrr(thetai, vp1, vs1, vp2, vs2, cmplx=cmplx)
 
     p = sin(thetai)/vp1; p2 = p*p
     a = rho2*(1-2*vs2**2*p2) - rho1*(1-2*vs1**2*p2)
@@ -91,6 +123,24 @@ def zoeppritzPray(thetai,vp1,vs1,rho1,vp2,vs2,rho2):
 
     return [PdPu, PdPd, PdSu, PdSd]
 
+def zoeppritzPrayAP(theta,vp1,vs1,rho1,vp2,vs2,rho2,units='radians'):
+    '''
+    Calculates the amplitude and phase of the complex solution to an incident down-going P-wave
+    ray for every angle/interface pair, including angles beyond critical.
+    :param theta: P-wave angles of incidence in radians (n_angles)
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces (n_interfaces)
+    :param rho1, rho2: densities for 2 halfspaces (n_interfaces)
+    :keyword units: units of the output phase, radians or degrees
+    :return: amp, phase arrays (4, n_interfaces, n_angles) ordered as zoeppritzPray
+    '''
+    if units not in ['radians', 'degrees']:
+        raise KeyError
+    thetai, vp1, vs1, rho1, vp2, vs2, rho2 = broadcastintf(theta,vp1,vs1,rho1,vp2,vs2,rho2)
+    shape = np.broadcast(thetai, vp1).shape
+    out = np.empty((4,) + shape, dtype=complex)
+    for i, val in enumerate(zoeppritzPray(thetai,vp1,vs1,rho1,vp2,vs2,rho2,cmplx=True)):
+        out[i] = val
+    return np.abs(out), np.angle(out, deg=(units == 'degrees'))
 
 def calcreflp(vp1,vs1,rho1,vp2,vs2,rho2):
     '''
@@ -157,6 +207,282 @@ def shuey(theta,vp1,vs1,rho1,vp2,vs2,rho2,mode='rtheta'):
     elif mode == 'R0_G':
         return [R0,G]
 
+# order of the partial derivatives returned by the *Jac functions
+jacparkeys = ['vp1', 'vs1', 'rho1', 'vp2', 'vs2', 'rho2']
+
+def calcreflratio(x1,x2):
+    '''
+    Calculates the contrast ratio of a property across an interface and its derivatives.
+    :param x1, x2: property of the 2 halfspaces
+    :return: list [dx/x, d(dx/x)/dx1, d(dx/x)/dx2] where dx/x = 2*(x2-x1)/(x1+x2)
+    '''
+    xs = x1 + x2
+    return [2*(x2-x1)/xs, -4*x2/(xs*xs), 4*x1/(xs*xs)]
+
+def _shueyJac(t,vp1,vs1,rho1,vp2,vs2,rho2):
+    '''
+    Rp = A + B*t and derivatives for the two term Shuey/Aki-Richards form.
+    '''
+    fvp, dfvp1, dfvp2 = calcreflratio(vp1, vp2)
+    fvs, dfvs1, dfvs2 = calcreflratio(vs1, vs2)
+    frho, dfrho1, dfrho2 = calcreflratio(rho1, rho2)
+    svp = vp1 + vp2; svs = vs1 + vs2
+    k = (svs*svs)/(svp*svp); dk_dvs = 2*svs/(svp*svp); dk_dvp = -2*svs*svs/(svp*svp*svp)
+    Q = frho + 2*fvs
+    Rp = 0.5*(fvp+frho) + (0.5*fvp - 2*k*Q)*t
+    jac = np.empty((6,) + np.shape(Rp))
+    jac[0] = 0.5*dfvp1*(1+t) - 2*t*dk_dvp*Q
+    jac[3] = 0.5*dfvp2*(1+t) - 2*t*dk_dvp*Q
+    jac[1] = -2*t*(dk_dvs*Q + 2*k*dfvs1)
+    jac[4] = -2*t*(dk_dvs*Q + 2*k*dfvs2)
+    jac[2] = (0.5 - 2*t*k)*dfrho1
+    jac[5] = (0.5 - 2*t*k)*dfrho2
+    return Rp, jac
+
+def shueyJac(theta,vp1,vs1,rho1,vp2,vs2,rho2):
+    '''
+    Shuey approximation and its analytic derivatives.
+    :param theta: P-wave angle of incidence for wavefront in radians
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces
+    :param rho1, rho2: densities for 2 halfspaces
+    :return: Rp(theta), jacobian array (6, ...) of dRp ordered as jacparkeys
+    '''
+    return _shueyJac(sin(theta)*sin(theta),vp1,vs1,rho1,vp2,vs2,rho2)
+
+def akirichardsJac(theta,vp1,vs1,rho1,vp2,vs2,rho2,method='avseth'):
+    '''
+    Aki-Richards reflectivity and its analytic derivatives.
+    :param theta: P-wave angle of incidence for wavefront in radians
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces
+    :param rho1, rho2: densities for 2 halfspaces
+    :param method: 'avseth' - avseth formulation or 'ar' - original aki-richards
+    :return: Rp(theta), jacobian array (6, ...) of dRp ordered as jacparkeys
+    '''
+    if method == 'ar':
+        return _shueyJac(theta*theta,vp1,vs1,rho1,vp2,vs2,rho2)
+    elif method != 'avseth':
+        raise KeyError(method)
+    fvp, dfvp1, dfvp2 = calcreflratio(vp1, vp2)
+    fvs, dfvs1, dfvs2 = calcreflratio(vs1, vs2)
+    frho, dfrho1, dfrho2 = calcreflratio(rho1, rho2)
+    t = sin(theta)*sin(theta)
+    m = 0.25*(vs1+vs2)**2; dm = 0.5*(vs1+vs2)
+    P = 1/(vp1*vp1); dP = -2*P/vp1
+    Q = frho + 2*fvs
+    u = vp2*sin(theta)/vp1
+    phi = 0.5*(theta + arcsin(u))
+    S = 1/(cos(phi)*cos(phi))
+    dS_du = S*tan(phi)/np.sqrt(1-u*u)
+    Rp = 0.5*frho - 2*m*P*Q*t + 0.5*fvp*S
+    jac = np.empty((6,) + np.shape(Rp))
+    jac[0] = 0.5*dfvp1*S - 0.5*fvp*dS_du*u/vp1 - 2*m*dP*Q*t
+    jac[3] = 0.5*dfvp2*S + 0.5*fvp*dS_du*u/vp2
+    jac[1] = -2*t*P*(dm*Q + 2*m*dfvs1)
+    jac[4] = -2*t*P*(dm*Q + 2*m*dfvs2)
+    jac[2] = (0.5 - 2*m*P*t)*dfrho1
+    jac[5] = (0.5 - 2*m*P*t)*dfrho2
+    return Rp, jac
+
+def bortfeldJac(theta,vp1,vs1,rho1,vp2,vs2,rho2):
+    '''
+    Bortfeld reflectivity and its analytic derivatives.
+    :param theta: P-wave angle of incidence for wavefront in radians
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces
+    :param rho1, rho2: densities for 2 halfspaces
+    :return: Rp(theta), jacobian array (6, ...) of dRp ordered as jacparkeys
+    '''
+    fvp, dfvp1, dfvp2 = calcreflratio(vp1, vp2)
+    fvs, dfvs1, dfvs2 = calcreflratio(vs1, vs2)
+    frho, dfrho1, dfrho2 = calcreflratio(rho1, rho2)
+    svp = vp1 + vp2; svs = vs1 + vs2
+    k = (svs*svs)/(svp*svp); dk_dvs = 2*svs/(svp*svp); dk_dvp = -2*svs*svs/(svp*svp*svp)
+    t = sin(theta)**2; w = (tan(theta)**2)*t
+    Q = frho + 4*fvs
+    Rp = 0.5*(fvp+frho) + (0.5*fvp - k*Q)*t + 0.5*fvp*w
+    jac = np.empty((6,) + np.shape(Rp))
+    jac[0] = 0.5*dfvp1*(1+t+w) - t*dk_dvp*Q
+    jac[3] = 0.5*dfvp2*(1+t+w) - t*dk_dvp*Q
+    jac[1] = -t*(dk_dvs*Q + 4*k*dfvs1)
+    jac[4] = -t*(dk_dvs*Q + 4*k*dfvs2)
+    jac[2] = (0.5 - t*k)*dfrho1
+    jac[5] = (0.5 - t*k)*dfrho2
+    return Rp, jac
+
+def zoeppritzPrayJac(thetai,vp1,vs1,rho1,vp2,vs2,rho2):
+    '''
+    Reflected P-wave amplitude of zoeppritzPray and its analytic derivatives. The derivatives
+    are propagated through the vertical slownesses alongside the forward calculation.
+    :param thetai: P-wave angle of incidence for wavefront in radians
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces
+    :param rho1, rho2: densities for 2 halfspaces
+    :return: Rp(theta), jacobian array (6, ...) of dRp ordered as jacparkeys
+    '''
+    shape = np.broadcast(thetai, vp1, vs1, rho1, vp2, vs2, rho2).shape
+    unit = np.zeros((6, 6) + (1,)*len(shape))
+    for i in range(6):
+        unit[i, i] = 1
+    dvp1, dvs1, drho1, dvp2, dvs2, drho2 = unit
+
+    p = sin(thetai)/vp1; dp = -p/vp1*dvp1
+    p2 = p*p; dp2 = 2*p*dp
+    qp1 = cos(thetai)/vp1; dqp1 = -qp1/vp1*dvp1        # vertical slownesses
+    qp2 = np.sqrt(1/vp2**2 - p2); dqp2 = (-dvp2/vp2**3 - 0.5*dp2)/qp2
+    qs1 = np.sqrt(1/vs1**2 - p2); dqs1 = (-dvs1/vs1**3 - 0.5*dp2)/qs1
+    qs2 = np.sqrt(1/vs2**2 - p2); dqs2 = (-dvs2/vs2**3 - 0.5*dp2)/qs2
+    du = rho2*vs2**2 - rho1*vs1**2
+    ddu = vs2**2*drho2 + 2*rho2*vs2*dvs2 - vs1**2*drho1 - 2*rho1*vs1*dvs1
+
+    a = rho2 - rho1 - 2*p2*du; da = drho2 - drho1 - 2*dp2*du - 2*p2*ddu
+    b = rho2 - 2*p2*du;        db = drho2 - 2*dp2*du - 2*p2*ddu
+    c = rho1 + 2*p2*du;        dc = drho1 + 2*dp2*du + 2*p2*ddu
+    d = 2*du;                  dd = 2*ddu
+    E = b*qp1 + c*qp2; dE = db*qp1 + b*dqp1 + dc*qp2 + c*dqp2
+    F = b*qs1 + c*qs2; dF = db*qs1 + b*dqs1 + dc*qs2 + c*dqs2
+    G = a - d*qp1*qs2; dG = da - dd*qp1*qs2 - d*dqp1*qs2 - d*qp1*dqs2
+    H = a - d*qp2*qs1; dH = da - dd*qp2*qs1 - d*dqp2*qs1 - d*qp2*dqs1
+    D = E*F + G*H*p2;  dD = dE*F + E*dF + (dG*H + G*dH)*p2 + G*H*dp2
+
+    L = b*qp1 - c*qp2; dL = db*qp1 + b*dqp1 - dc*qp2 - c*dqp2
+    M = a + d*qp1*qs2; dM = da + dd*qp1*qs2 + d*dqp1*qs2 + d*qp1*dqs2
+    N = L*F - M*H*p2;  dN = dL*F + L*dF - (dM*H + M*dH)*p2 - M*H*dp2
+
+    Rp = N/D
+    jac = np.broadcast_to((dN - Rp*dD)/D, (6,) + shape).copy()
+    return np.broadcast_to(Rp, shape).copy(), jac
+
+# keys of the models calculated by calcreflmods
+reflmodkeys = ['zoepRp', 'zoepTp', 'zoepRs', 'zoepTs',
+               'bortfeldRp',
+               'ar_avsethRp', 'ar_arRp',
+               'shuey']
+
+def broadcastintf(theta,vp1,vs1,rho1,vp2,vs2,rho2):
+    '''
+    Reshapes angles and interface properties so they broadcast against each other.
+    :param theta: P-wave angles of incidence in radians, scalar or vector of length n_angles
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces, scalars or vectors of length n_interfaces
+    :param rho1, rho2: densities for 2 halfspaces, scalars or vectors of length n_interfaces
+    :return: list [theta, vp1, vs1, rho1, vp2, vs2, rho2] where theta is (1, n_angles) and
+             the interface properties are (n_interfaces, 1)
+    '''
+    out = [np.atleast_1d(np.asarray(theta, dtype=float)).ravel()[np.newaxis, :]]
+    for prop in [vp1, vs1, rho1, vp2, vs2, rho2]:
+        out.append(np.atleast_1d(np.asarray(prop, dtype=float)).ravel()[:, np.newaxis])
+    return out
+
+def calcreflmods(theta,vp1,vs1,rho1,vp2,vs2,rho2,models=None):
+    '''
+    Calculates the reflectivity models for every interface at every angle in a single
+    broadcast pass rather than calling each model once per angle.
+    :param theta: P-wave angles of incidence in radians (n_angles)
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces (n_interfaces)
+    :param rho1, rho2: densities for 2 halfspaces (n_interfaces)
+    :keyword models: list of keys from reflmodkeys to calculate, None calculates all
+    :return: dict of model key : array (n_interfaces, n_angles)
+    '''
+    if models is None:
+        models = reflmodkeys
+    for mk in models:
+        if mk not in reflmodkeys:
+            raise KeyError(mk)
+    theta, vp1, vs1, rho1, vp2, vs2, rho2 = broadcastintf(theta,vp1,vs1,rho1,vp2,vs2,rho2)
+    shape = np.broadcast(theta, vp1).shape
+    out = dict()
+    if any(mk in models for mk in reflmodkeys[:4]):
+        out['zoepRp'], out['zoepTp'], out['zoepRs'], out['zoepTs'] = \
+            zoeppritzPray(theta,vp1,vs1,rho1,vp2,vs2,rho2)
+    if 'bortfeldRp' in models:
+        out['bortfeldRp'] = bortfeld(theta,vp1,vs1,rho1,vp2,vs2,rho2)
+    if 'ar_avsethRp' in models:
+        out['ar_avsethRp'] = akirichards(theta,vp1,vs1,rho1,vp2,vs2,rho2,method='avseth')
+    if 'ar_arRp' in models:
+        out['ar_arRp'] = akirichards(theta,vp1,vs1,rho1,vp2,vs2,rho2,method='ar')
+    if 'shuey' in models:
+        out['shuey'] = shuey(theta,vp1,vs1,rho1,vp2,vs2,rho2)
+    return dict((mk, np.broadcast_to(out[mk], shape).copy()) for mk in models)
+
+# approximations tried by calcreflfast in order of increasing cost, zoepRp is the fallback. Per interface
+# shuey and bortfeldRp cost about the same (bortfeldRp is the more accurate for some contrasts), ar_avsethRp
+# about 4x and zoepRp about 20x.
+reflfastmodels = ['shuey', 'bortfeldRp', 'ar_avsethRp', 'zoepRp']
+
+@lru_cache(maxsize=8)
+def calcreflerrtable(contrasts=(0.02,0.05,0.1,0.15,0.2,0.3,0.45,0.6),minvsvp=0.3,maxvsvp=0.8,nvsvp=11,
+                     maxangle=60,nangle=61):
+    '''
+    Tabulates the worst absolute error of each approximation against zoeppritzPray. Rp depends only upon
+    the background vs/vp ratio and the vp, vs and rho contrasts, the errors are calculated on a grid of these
+    and reduced to the worst error of each grid cell. The table is cached so it is only calculated once per
+    set of arguments.
+    :keyword contrasts: increasing positive contrasts 2*(x2-x1)/(x1+x2) of vp, vs or rho tabulated, the
+                        contrast axis is these, 0 and their negatives (finer cells for small contrasts)
+    :keyword minvsvp, maxvsvp, nvsvp: background vs/vp axis (vs1+vs2)/(vp1+vp2)
+    :keyword maxangle: largest angle of incidence tabulated in degrees
+    :keyword nangle: number of angles tabulated between 0 and maxangle
+    :return: vs/vp axis, contrast axis, angle axis (radians), error array
+             (n_approx, nvsvp-1, ncon-1, ncon-1, ncon-1, nangle) where error[:, i, j, k, l, m]
+             is the worst error in the cell of vs/vp i, vp contrast j, vs contrast k, rho contrast l for
+             angles <= angle[m]
+    '''
+    vsvp = np.linspace(minvsvp, maxvsvp, nvsvp)
+    con = np.concatenate([-np.array(contrasts)[::-1], [0.], contrasts]); ncontrast = con.size
+    ang = np.radians(np.linspace(0, maxangle, nangle))
+    gvsvp, fvp, fvs, frho = [g.ravel() for g in np.meshgrid(vsvp, con, con, con, indexing='ij')]
+    vp = 3000.0; rho = 2.3; vs = vp*gvsvp
+    with np.errstate(invalid='ignore'):
+        mods = calcreflmods(ang, vp*(1-0.5*fvp), vs*(1-0.5*fvs), rho*(1-0.5*frho),
+                            vp*(1+0.5*fvp), vs*(1+0.5*fvs), rho*(1+0.5*frho), models=reflfastmodels)
+    shape = (nvsvp, ncontrast, ncontrast, ncontrast, nangle)
+    err = np.empty((len(reflfastmodels)-1, nvsvp-1, ncontrast-1, ncontrast-1, ncontrast-1, nangle))
+    for i, mk in enumerate(reflfastmodels[:-1]):
+        merr = np.abs(mods[mk] - mods['zoepRp'])
+        merr[~np.isfinite(merr)] = np.inf
+        merr = np.maximum.accumulate(merr, axis=1).reshape(shape)
+        for axis in range(4):  # worst of the 2 nodes bounding each cell along every axis
+            lo = [slice(None)]*5; hi = [slice(None)]*5
+            lo[axis] = slice(None, -1); hi[axis] = slice(1, None)
+            merr = np.maximum(merr[tuple(lo)], merr[tuple(hi)])
+        err[i] = merr
+    return vsvp, con, ang, err
+
+def calcreflfast(theta,vp1,vs1,rho1,vp2,vs2,rho2,tol=0.005,margin=0.1):
+    '''
+    Calculates Rp(theta) for every interface using the cheapest approximation whose tabulated
+    error against zoeppritzPray is within tol, falling back to zoeppritzPray otherwise. Interfaces
+    outside of the tabulated vs/vp, contrast or angle range always use zoeppritzPray.
+    :param theta: P-wave angles of incidence in radians (n_angles)
+    :param vp1, vs1, vp2, vs2: velocities for 2 halfspaces (n_interfaces)
+    :param rho1, rho2: densities for 2 halfspaces (n_interfaces)
+    :keyword tol: maximum absolute error allowed in Rp
+    :keyword margin: fractional safety margin on the tabulated errors for variation within a table cell
+    :return: Rp array (n_interfaces, n_angles), index array (n_interfaces) of the model in
+             reflfastmodels used for each interface
+    '''
+    theta, vp1, vs1, rho1, vp2, vs2, rho2 = broadcastintf(theta,vp1,vs1,rho1,vp2,vs2,rho2)
+    props = np.broadcast_arrays(vp1, vs1, rho1, vp2, vs2, rho2)
+    vsvp, con, ang, err = calcreflerrtable()
+    nintf = props[0].shape[0]
+    # table cell of every interface, -1 outside of the table
+    cells = []
+    for axis, x in [(vsvp, (props[1] + props[4])[:, 0]/(props[0] + props[3])[:, 0])] + \
+                   [(con, calcreflratio(props[i], props[i+3])[0][:, 0]) for i in range(3)]:
+        icell = np.searchsorted(axis, x, side='right') - 1
+        icell[~((x >= axis[0]) & (x <= axis[-1]))] = -1
+        cells.append(np.minimum(icell, axis.size - 2))
+    iang = np.searchsorted(ang, np.max(theta) - 1e-9)
+    ierr = np.full((len(reflfastmodels)-1, nintf), np.inf)
+    inside = np.all(np.array(cells) >= 0, axis=0)
+    if iang < ang.size:
+        ierr[:, inside] = err[(slice(None),) + tuple(icell[inside] for icell in cells) + (iang,)]
+    ok = np.vstack([ierr*(1. + margin) <= tol, np.ones((1, nintf), dtype=bool)])
+    choice = np.argmax(ok, axis=0)
+    Rp = np.empty((nintf, theta.size))
+    for i, mk in enumerate(reflfastmodels):
+        sel = choice == i
+        if np.any(sel):
+            Rp[sel] = calcreflmods(theta, *[x[sel, 0] for x in props], models=[mk])[mk]
+    return Rp, choice
+
 if __name__ == "__main__":
     from numpy import round
     from tests import test_title_msg, test_msg
@@ -184,11 +510,25 @@ if __name__ == "__main__":
     qcr_zoeppritzfull = [0.065510, -0.152313, 0.884692, -0.142204]
     act_zoeppritzfull = round(zoeppritzfull(thetair,vp1,vs1,rho1,vp2,vs2,rho2),6)
     test_msg('zoeppritzfull','full zoeppritz equation',act_zoeppritzfull,qcr_zoeppritzfull)
+    act_zoeppritzfullStack = zoeppritzfullStack([0, thetair],[vp1,vp2],[vs1,vs2],[rho1,rho2],
+                                                [vp2,vp1],[vs2,vs1],[rho2,rho1])
+    test_msg('zoeppritzfullStack','output shape',act_zoeppritzfullStack.shape,(4,2,2))
+    test_msg('zoeppritzfullStack','full zoeppritz equation',round(act_zoeppritzfullStack[:,0,1],6),
+             qcr_zoeppritzfull)
 
     test_title_msg("zoeppritzPray")
     qcr_zoeppritzPray = [0.077261, 0.901362, -0.076451, -0.085402]
     act_zoeppritzPray = round(zoeppritzPray(thetair,vp1,vs1,rho1,vp2,vs2,rho2),6)
     test_msg('zoeppritzPray','all parameters',act_zoeppritzPray,qcr_zoeppritzPray)
+    act_zoeppritzPray_c = round(np.real(zoeppritzPray(thetair,vp1,vs1,rho1,vp2,vs2,rho2,cmplx=True)),6)
+    test_msg('zoeppritzPray','cmplx=True pre-critical',act_zoeppritzPray_c,act_zoeppritzPray)
+    thetav = np.radians(np.arange(0, 91, 1.0))
+    act_ap_amp, act_ap_phase = zoeppritzPrayAP(thetav,vp1,vs1,rho1,vp2,vs2,rho2)
+    test_msg('zoeppritzPrayAP','no NaN past critical',np.isfinite(act_ap_amp[0,0,:90]).all(),True)
+    qcr_ap_50 = round(abs(zoeppritzPray(thetav[50],vp1,vs1,rho1,vp2,vs2,rho2)[0]),6)
+    act_ap_50 = round(act_ap_amp[0,0,50],6)
+    test_msg('zoeppritzPrayAP','amplitude pre-critical',act_ap_50,qcr_ap_50)
+    test_msg('zoeppritzPrayAP','phase shift past critical',act_ap_phase[0,0,70] > 0,True)
 
     test_title_msg("calcreflp")
     qcr_calcreflp = [3250.000000, 2000.000000, 2.475000, 0.615385, 500.000000, 400.000000, 0.150000]
@@ -214,4 +554,50 @@ if __name__ == "__main__":
     qcr_shuey_r0_g = [0.10722610722610722, -0.27193831809216423]
     act_shuey_r0_g = shuey(thetair,vp1,vs1,rho1,vp2,vs2,rho2,mode='R0_G')
     test_msg('shuey','mode=rtheta',act_shuey_rtheta,qcr_shuey_rtheta)
-    test_msg('shuey','mode=R0_G',act_shuey_r0_g,qcr_shuey_r0_g)
\ No newline at end of file
+    test_msg('shuey','mode=R0_G',act_shuey_r0_g,qcr_shuey_r0_g)
+
+    test_title_msg('reflectivity jacobians')
+    dx = 1e-6
+    intf = np.array([vp1, vs1, rho1, vp2, vs2, rho2])
+    for fjac, fref in [(shueyJac, shuey), (bortfeldJac, bortfeld),
+                       (akirichardsJac, akirichards), (zoeppritzPrayJac, lambda *x: zoeppritzPray(*x)[0])]:
+        act_Rp, act_jac = fjac(thetair, *intf)
+        qcr_jac = np.empty(6)
+        for i in range(6):
+            h = intf[i]*dx; xp = intf.copy(); xm = intf.copy(); xp[i] += h; xm[i] -= h
+            qcr_jac[i] = (fref(thetair, *xp) - fref(thetair, *xm))/(2*h)
+        test_msg(fjac.__name__,'forward value',round(act_Rp,12),round(fref(thetair, *intf),12))
+        test_msg(fjac.__name__,'central difference',np.allclose(act_jac,qcr_jac,rtol=1e-5,atol=1e-9),True)
+
+    test_title_msg('calcreflmods')
+    thetav = np.radians(np.arange(0, 61, 1.0))
+    act_reflmods = calcreflmods(thetav,[vp1,vp2],[vs1,vs2],[rho1,rho2],[vp2,vp1],[vs2,vs1],[rho2,rho1])
+    qcr_reflmods_shape = (2, thetav.size)
+    test_msg('calcreflmods','output shape',act_reflmods['zoepRp'].shape,qcr_reflmods_shape)
+    qcr_reflmods_zoep = round(zoeppritzPray(thetav[20],vp1,vs1,rho1,vp2,vs2,rho2),6)
+    act_reflmods_zoep = round([act_reflmods[mk][0,20] for mk in ['zoepRp','zoepTp','zoepRs','zoepTs']],6)
+    test_msg('calcreflmods','zoeppritzPray 20deg',act_reflmods_zoep,qcr_reflmods_zoep)
+    qcr_reflmods_shuey = round(shuey(thetav[20],vp2,vs2,rho2,vp1,vs1,rho1),6)
+    act_reflmods_shuey = round(act_reflmods['shuey'][1,20],6)
+    test_msg('calcreflmods','shuey 2nd interface',act_reflmods_shuey,qcr_reflmods_shuey)
+
+    test_title_msg('calcreflfast')
+    thetav = np.radians(np.arange(0, 41, 1.0))
+    act_fast, act_choice = calcreflfast(thetav,[vp1,vp1,2500],[vs1,vs1,1200],[rho1,rho1,2.0],
+                                        [vp1*1.01,vp2,3200],[vs1*1.01,vs2,1900],[rho1,rho2,2.6],tol=0.005)
+    test_msg('calcreflfast','small contrast uses shuey',act_choice[0],0)
+    test_msg('calcreflfast','large contrast uses zoeppritz',act_choice[2],len(reflfastmodels)-1)
+    act_fast, act_choice = calcreflfast(thetav,vp1,0.9*vp1,rho1,vp1*1.01,0.9*vp1,rho1,tol=0.005)
+    test_msg('calcreflfast','vs/vp outside table uses zoeppritz',act_choice[0],len(reflfastmodels)-1)
+    rng = np.random.default_rng(5); nintf = 20000
+    rvp1 = rng.uniform(2000, 4000, nintf); rvs1 = rvp1*rng.uniform(0.4, 0.75, nintf)
+    rrho1 = rng.uniform(2.0, 2.6, nintf)
+    rintf = [rvp1, rvs1, rrho1] + [x*(1 + rng.uniform(-0.3, 0.3, nintf)) for x in [rvp1, rvs1, rrho1]]
+    for maxangle, tol in [(20, 0.01), (20, 0.005), (40, 0.005)]:
+        thetav = np.radians(np.arange(0, maxangle+1, 1.0))
+        act_fast, act_choice = calcreflfast(thetav, *rintf, tol=tol)
+        qcr_fast = calcreflmods(thetav, *rintf, models=['zoepRp'])['zoepRp']
+        test_msg('calcreflfast','random interfaces within tol=%g to %d deg' % (tol, maxangle),
+                 bool(np.max(np.abs(act_fast-qcr_fast)) <= tol),True)
+    act_fast, act_choice = calcreflfast(np.radians(np.arange(0, 21, 1.0)), *rintf, tol=0.01)
+    test_msg('calcreflfast','every approximation used',np.all(np.bincount(act_choice, minlength=4) > 0),True)
@@ -30,6 +30,7 @@ from bokeh.models.widgets import DataTable, TableColumn, Select, Tabs, Panel, Sl
 
 from data.structLith import structMineral, structFluid, structDryFrame, structRock
 from layouts import fdi, dims
+from layouts.scheduler import computeScheduler
 
 # Initial Data
 inputs = 'inputs'
@@ -50,12 +51,15 @@ avofig = figure(title="Amplitude of Reflectivity vs Offset(deg)", tools="wheel_z
 avostatsource = dict()
 avostatfig = figure(title="Intercept vs Gradient", tools="wheel_zoom,pan,reset")
 
+# Model calculations run off the document thread, only the latest slider/selection value is computed
+scheduler = computeScheduler(curdoc())
+
 # 4D Impedance
 plot_scale = 100 + 1
-fourdimp = fdi.widgetFDI(plot_scale, 5, 25)
+fourdimp = fdi.widgetFDI(plot_scale, 5, 25, scheduler=scheduler)
 
 # Input Panels
-gp_dims = dims.widgetDIMS(idepth,fr,ff,fp,fdi=fourdimp)
+gp_dims = dims.widgetDIMS(idepth,fr,ff,fp,fdi=fourdimp,scheduler=scheduler)
 
 #Layout of Page
 plottab1 = Panel(child=avofig, title='AVO Reflectivity')
@@ -18,7 +18,7 @@ from bokeh.plotting import figure
 
 from bokeh.models.widgets import DataTable, TableColumn, Select, Slider
 
-from func.funcZoep import zoeppritzfull, bortfeld, akirichards, shuey, zoeppritzPray
+from func.funcZoep import calcreflmods, reflmodkeys
 
 import numpy as np
 
@@ -34,12 +34,8 @@ def createDataTable(min,max,nang):
     ang = np.arange(min,max+da,da);
     #mod = ang.repeat(2).reshape([nang,2])
     mod = np.empty(ang.shape)
-    avomodkeys = ['zoepRp','zoepTp','zoepRs','zoepTs',
-                  'bortfeldRp',
-                  'ar_avsethRp','ar_arRp',
-                  'shuey']
     avomoddict = {'ang' : ang}
-    for mk in avomodkeys:
+    for mk in reflmodkeys:
         avomoddict[mk] = mod
     return ColumnDataSource(avomoddict)
 
@@ -52,23 +48,11 @@ def updateAVOmod(datatable,vp1,vs1,rho1,vp2,vs2,rho2):
     :param rho1, rho2: densities for 2 halfspaces
     :return: updates datatable in place
     '''
-    avomodkeys = ['zoepRp', 'zoepTp', 'zoepRs', 'zoepTs',
-                  'bortfeldRp',
-                  'ar_avsethRp','ar_arRp',
-                  'shuey']
     ang = np.radians(datatable.data['ang'])
-    ldict = dict()
-    for mk in avomodkeys: ldict[mk] = np.empty(ang.shape)
-    for i,a in enumerate(ang):
-        ldict['zoepRp'][i], ldict['zoepTp'][i], ldict['zoepRs'][i], ldict['zoepTs'][i] =\
-            zoeppritzPray(a,vp1,vs1,rho1,vp2,vs2,rho2)
-        ldict['bortfeldRp'][i] = bortfeld(a,vp1,vs1,rho1,vp2,vs2,rho2)
-        ldict['ar_avsethRp'][i] = akirichards(a,vp1,vs1,rho1,vp2,vs2,rho2,method='avseth')
-        ldict['ar_arRp'][i] = akirichards(a,vp1,vs1,rho1,vp2,vs2,rho2,method='ar')
-        ldict['shuey'][i] = shuey(a,vp1,vs1,rho1,vp2,vs2,rho2)
-
-    for mk in avomodkeys: #update datasource
-        datatable.data[mk] = ldict[mk].tolist()
+    ldict = calcreflmods(ang,vp1,vs1,rho1,vp2,vs2,rho2)
+
+    for mk in reflmodkeys: #update datasource
+        datatable.data[mk] = ldict[mk][0].tolist()
 
 if __name__ == "__main__":
     from numpy import round
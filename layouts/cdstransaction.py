@@ -0,0 +1,112 @@
+###############################################################################
+
+# Author: Antony Hallam
+# Company: HWU
+# Date: 18-10-2026
+
+# File Name: cdstransaction.py
+
+# Synopsis:
+# Batched ColumnDataSource updates so one user action sends one change per
+# source to the browser.
+
+###############################################################################
+
+from collections import OrderedDict
+
+
+class cdsTransaction(object):
+    """
+    Collects column updates and patches for ColumnDataSources. Inside a with block (which may be nested,
+    e.g. callbacks triggered by other callbacks) changes are staged and applied when the outermost block
+    exits, as one data.update (a single ColumnDataChanged event with only the changed columns) or, when
+    only patches were staged, one patch per source. Outside a with block each update call is applied immediately as one event.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.clear()
+
+    def clear(self):
+        self._sources = OrderedDict()  # id(source): source
+        self._data = dict()            # id(source): staged columns
+        self._patches = dict()         # id(source): staged patches
+
+    def __enter__(self):
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.clear()
+        return False
+
+    def update(self, source, **columns):
+        """
+        :param source: ColumnDataSource
+        :param columns: column name to new values
+        """
+        if self.depth == 0:
+            source.data.update(columns)
+            return
+        self._sources[id(source)] = source
+        self._data.setdefault(id(source), OrderedDict()).update(columns)
+
+    def patch(self, source, patches):
+        """
+        :param source: ColumnDataSource
+        :param patches: dict of column name to list of (index or slice, new values), see ColumnDataSource.patch
+        """
+        if self.depth == 0:
+            source.patch(patches)
+            return
+        self._sources[id(source)] = source
+        staged = self._patches.setdefault(id(source), OrderedDict())
+        for key, changes in patches.items():
+            staged.setdefault(key, []).extend(changes)
+
+    def commit(self):
+        sources, data, patches = self._sources, self._data, self._patches
+        self.clear()
+        for sid, source in sources.items():
+            columns = data.get(sid, OrderedDict()); staged = patches.get(sid, dict())
+            if columns:
+                # fold patches into the update so the source still changes with one event
+                for key, changes in staged.items():
+                    col = columns[key] if key in columns else source.data[key]
+                    col = col.copy() if hasattr(col, 'copy') else list(col)
+                    for ind, val in changes:
+                        col[ind] = val
+                    columns[key] = col
+                source.data.update(columns)
+            elif staged:
+                source.patch(dict(staged))
+
+
+if __name__ == "__main__":
+    from bokeh.models import ColumnDataSource
+    from tests import test_msg, test_title_msg
+
+    test_title_msg('cdsTransaction')
+    cds = ColumnDataSource(dict(a=[0, 0], b=[0, 0]))
+    events = []
+    cds.on_change('data', lambda attr, old, new: events.append(attr))
+    tr = cdsTransaction()
+    with tr:
+        tr.update(cds, a=[1, 1])
+        with tr:
+            tr.update(cds, b=[2, 2])
+        test_msg('cdsTransaction', 'staged until outer exit', cds.data['a'] + [len(events)], [0, 0, 0])
+    test_msg('cdsTransaction', 'one event per source', len(events), 1)
+    test_msg('cdsTransaction', 'values applied', cds.data['a'] + cds.data['b'], [1, 1, 2, 2])
+    with tr:
+        tr.update(cds, a=[4, 4])
+        tr.patch(cds, dict(a=[(0, 5)], b=[(1, 6)]))
+    test_msg('cdsTransaction', 'patches folded into update', cds.data['a'] + cds.data['b'] + [len(events)],
+             [5, 4, 2, 6, 2])
+    tr.update(cds, a=[3, 3])
+    test_msg('cdsTransaction', 'immediate outside with', cds.data['a'] + [len(events)], [3, 3, 3])
@@ -28,8 +28,12 @@ import pandas as pd
 from bokeh.layouts import row, column
 from bokeh.models import TableColumn, DataTable, ColumnDataSource, Panel, Tabs
 from bokeh.models.widgets import Slider, Select, Div
+from bokeh.plotting import figure
 
-from data.structLith import structRock, structMineral, structFluid, structDryFrame
+from data.structLith import structMineral, structRockModel, structRockBatch
+from layouts.cdstransaction import cdsTransaction
+from layouts.scheduler import computeScheduler
+from func.funcRP import calcBWFluids
 #from func.funcRP import calcDryFrame_dPres, calcVelp, calcVels, gassmann_dry2fluid, mixfluid
 
 class widgetDIMS(object):
@@ -38,16 +42,20 @@ class widgetDIMS(object):
                           'knonclay', 'munonclay', 'rhononclay',
                           'vclay', 'phi', 'dryEk', 'dryPk', 'dryEg', 'dryPg']
     column_names_fluids = ['Name', 'ko', 'rhoo', 'kw', 'rhow', 'kg', 'rhog', 'so', 'sw', 'sg'   ]
+    column_names_pvt = ['temp', 'sal', 'api', 'grav']  # optional, see calcPVT
     column_names_pres = ['Name', 'OB_Grad', 'init_Pres', 'curr_Pres']
     column_names_output = ['rock', 'fluid', 'Vp', 'Vs', 'rho', 'other']
+    column_names_trend = ['depth', 'obVp', 'obVs', 'resVp', 'resVs']
+    trend_depth = np.arange(0, 10001, 50.)  # mTVDSS
 
-    def __init__(self,init_depth,file_rocks,file_fluids,file_prespfs,fdi=None):
+    def __init__(self,init_depth,file_rocks,file_fluids,file_prespfs,fdi=None,scheduler=None):
         '''
         :param init_depth: Initial depth to model (TVDSS).
         :param file_rocks: File with input mineral parameters.
         :param file_fluids: File with input fluid parameters.
         :param file_prespfs: File with input pressure profiles.
         :keyword dependents: A list of geoPy widgets which need to be updated when widgetDIMS is changed.
+        :keyword scheduler: computeScheduler for the selection callbacks, default synchronous
         '''
         # Initial Data
         self.df_rocks = pd.read_csv(file_rocks, skipinitialspace=True)
@@ -56,12 +64,18 @@ class widgetDIMS(object):
         self.init_depth = init_depth  # mTVDSS
         self.pagewidth = 1000  # pixels
         self.fdi = fdi
+        # persistent rock models, only quantities depending on changed inputs are recalculated
+        self.modelObr = None; self.modelRes = None
+        # batches the ColumnDataSource changes of each user action
+        self.cds = cdsTransaction()
+        self.scheduler = computeScheduler() if scheduler is None else scheduler
 
         # Setup Sources
         self.CDS_rocks = ColumnDataSource(self.df_rocks)
         self.CDS_fluids = ColumnDataSource(self.df_fluids)
         self.CDS_pres = ColumnDataSource(self.df_pres)
         self.CDS_out = ColumnDataSource(data=dict())
+        self.CDS_trend = ColumnDataSource(data=dict((key, []) for key in self.column_names_trend))
         # Extract Names
         self.odict_rocks = self.__odictIndex(self.df_rocks.Name.tolist())
         self.odict_fluids = self.__odictIndex(self.df_fluids.Name.tolist())
@@ -81,8 +95,10 @@ class widgetDIMS(object):
 
     def createTableWidgets(self):
         self.col_rocks =  [TableColumn(field=Ci, title=Ci) for Ci in self.column_names_rocks]
-        self.col_fluids = [TableColumn(field=Ci, title=Ci) for Ci in self.column_names_fluids]
-        self.col_pres =   [TableColumn(field=Ci, title=Ci) for Ci in self.column_names_pres]
+        self.col_fluids = [TableColumn(field=Ci, title=Ci) for Ci in self.column_names_fluids +
+                           [Ci for Ci in self.column_names_pvt if Ci in self.df_fluids]]
+        self.col_pres =   [TableColumn(field=Ci, title=Ci) for Ci in self.column_names_pres +
+                           [Ci for Ci in ['Pres_Grad'] if Ci in self.df_pres]]
         self.col_out =    [TableColumn(field=Ci, title=Ci) for Ci in self.column_names_output]
         #Setup table widgets
         tablekwargs = {'width': self.pagewidth, 'editable': True}
@@ -90,6 +106,14 @@ class widgetDIMS(object):
         self.TW_fluids = DataTable(source=self.CDS_fluids, columns=self.col_fluids, **tablekwargs)
         self.TW_pres =   DataTable(source=self.CDS_pres,   columns=self.col_pres,   **tablekwargs)
         self.TW_out =    DataTable(source=self.CDS_out,    columns=self.col_out,    **tablekwargs)
+        #Depth trends of the selections
+        self.figTrend = figure(title='Depth Trends', tools="wheel_zoom,pan,reset", width=self.pagewidth, height=200,
+                               y_range=(self.trend_depth[-1], self.trend_depth[0]))
+        self.figTrend.xaxis.axis_label = 'Velocity (km/s)'; self.figTrend.yaxis.axis_label = 'Depth (TVDSS)'
+        for key, col, dash in [('obVp', 'purple', 'solid'), ('obVs', 'purple', 'dashed'),
+                               ('resVp', 'orange', 'solid'), ('resVs', 'orange', 'dashed')]:
+            self.figTrend.line(key, 'depth', source=self.CDS_trend, line_color=col, line_dash=dash, legend=key)
+        self.figTrend.legend.location = 'bottom_left'
 
     def createControls(self):
         # Setup Select Panes and Input Widgets
@@ -123,9 +147,10 @@ class widgetDIMS(object):
         self.inputTab2 = Panel(child=self.TW_fluids, title='Fluid Mixes')
         self.inputTab3 = Panel(child=self.TW_pres,   title='Pressure Scenarios')
         self.inputTab4 = Panel(child=self.TW_out,    title='Model Calculations')
+        self.inputTab5 = Panel(child=self.figTrend,  title='Depth Trends')
 
         self.inputTabs = Tabs(tabs=[self.inputTab1, self.inputTab2,
-                                    self.inputTab3, self.inputTab4],
+                                    self.inputTab3, self.inputTab4, self.inputTab5],
                                     width=self.pagewidth, height=200)
 
         textrowob = Div(text="<h1> Overburden: </h1>")
@@ -141,69 +166,147 @@ class widgetDIMS(object):
                              selectrowpres, width=self.pagewidth)
 
     def on_selection_change(self,attribute,old,new):
-        # update active selections
-        self.activeObr =  self.df_rocks.loc[self.odict_rocks[self.selectObr.value]]     #Overburden Rock and Fluid
-        self.activeObf =  self.df_fluids.loc[self.odict_fluids[self.selectObf.value]]
-        self.activeResR = self.df_rocks.loc[self.odict_rocks[self.selectResR.value]]    #Reservoir Rock and Fluid
-        self.activeResF = self.df_fluids.loc[self.odict_fluids[self.selectResf.value]]
-        self.activePresPf = self.df_pres.loc[self.odict_pres[self.selectPres.value]]  #Pressure Profile
-        self.cur_depth = self.slideDepth.value
-        self.updateRocks()
-        self.updateFluids()
-        self.updateRockModel()
+        # read the widget selections on the document thread, the models are calculated by the scheduler
+        selection = dict(obr=self.selectObr.value, obf=self.selectObf.value, resr=self.selectResR.value,
+                         resf=self.selectResf.value, pres=self.selectPres.value, depth=self.slideDepth.value)
+        self.scheduler.submit('selection', self.calcSelection, self.applySelection, selection)
+
+    def calcSelection(self, selection):
+        '''
+        Updates the rock models for the selections without modifying any bokeh models or the active
+        selections read on the document thread. The rock models are only used here, the scheduler runs
+        one 'selection' request at a time.
+        :return: active selections, CDS_out and CDS_trend columns and the fdi model (see widgetFDI.calcModel)
+        '''
+        active = dict(activeObr=self.df_rocks.loc[self.odict_rocks[selection['obr']]],     #Overburden Rock and Fluid
+                      activeObf=self.df_fluids.loc[self.odict_fluids[selection['obf']]],
+                      activeResR=self.df_rocks.loc[self.odict_rocks[selection['resr']]],   #Reservoir Rock and Fluid
+                      activeResF=self.df_fluids.loc[self.odict_fluids[selection['resf']]],
+                      activePresPf=self.df_pres.loc[self.odict_pres[selection['pres']]],   #Pressure Profile
+                      cur_depth=selection['depth'])
+        self.updateRocks(active)
+        self.updateFluids(active)
+        out = self.calcRockOutputs(active)
+        trend = self.calcTrendOutputs(active)
+        fdimodel = None
         if self.fdi != None:
-            self.fdi.updateModel(self.activeResR_dry, self.activeResF_mix, self.fdi.min_pres, self.fdi.max_pres,
-                                 init_imp=self.activeResRM.pimp)
+            fdimodel = self.fdi.calcModel(self.modelRes, self.modelRes, self.fdi.min_pres, self.fdi.max_pres,
+                                          init_imp=self.modelRes.pimp, pvt=self.calcPVT(active['activeResF']))
+        return active, out, trend, fdimodel
 
-    def updateRocks(self):
-        #update rock models based upon selections
+    def applySelection(self, result):
+        active, out, trend, fdimodel = result
+        # update active selections
+        for attr, val in active.items():
+            setattr(self, attr, val)
+        with self.cds:
+            self.cds.update(self.CDS_out, **out)
+            self.cds.update(self.CDS_trend, **trend)
+        if fdimodel is not None:
+            self.fdi.applyModel(fdimodel)
+
+    def updateRocks(self, active):
+        '''
+        update rock models based upon selections
+        :param active: active selections, see calcSelection
+        '''
+        activeObr = active['activeObr']; activeResR = active['activeResR']; activePresPf = active['activePresPf']
         parnonclay = ['knonclay', 'munonclay', 'rhononclay'];
         parclay = ['kclay', 'muclay', 'rhoclay']
-        obnonshale = structMineral('nonshale', *[self.activeObr[par] for par in parnonclay])
-        obshale = structMineral('shale', *[self.activeObr[par] for par in parclay])
-        nonshale = structMineral('nonshale', *[self.activeResR[par] for par in parnonclay])
-        shale = structMineral('shale', *[self.activeResR[par] for par in parclay])
-        # output rock names to table
-        self.CDS_out.data['rock'] = [self.activeObr['Name'], self.activeResR['Name']]
+        obnonshale = structMineral('nonshale', *[activeObr[par] for par in parnonclay])
+        obshale = structMineral('shale', *[activeObr[par] for par in parclay])
+        nonshale = structMineral('nonshale', *[activeResR[par] for par in parnonclay])
+        shale = structMineral('shale', *[activeResR[par] for par in parclay])
 
         #update dryrock properties
-        self.activeObr_dry = structDryFrame(self.activeObr['Name'], obnonshale, obshale, self.activeObr['vclay'],
-                                   self.activeObr['phi'])
-        self.activeResR_dry = structDryFrame(self.activeResR['Name'], nonshale, shale, self.activeResR['vclay'],
-                                    self.activeResR['phi'])
-        self.activeObr_dry.calcRockMatrix(); self.activeResR_dry.calcRockMatrix()
-        parp = ['init_Pres', 'curr_Pres']; pardry = ['dryEk', 'dryPk', 'dryEg', 'dryEk']
-        self.activeObr_dry.calcDryFrame(self.activePresPf['OB_Grad'], self.cur_depth, *[self.activePresPf[par] for par in parp],
-                               *[self.activeObr[par] for par in pardry])
-        self.activeResR_dry.calcDryFrame(self.activePresPf['OB_Grad'], self.cur_depth, *[self.activePresPf[par] for par in parp],
-                                *[self.activeResR[par] for par in pardry])
-
-    def updateFluids(self):
+        parp = ['init_Pres', 'curr_Pres']; pardry = ['dryEk', 'dryPk', 'dryEg', 'dryPg']
+        for attr, activeRock, rnonshale, rshale in [('modelObr', activeObr, obnonshale, obshale),
+                                                    ('modelRes', activeResR, nonshale, shale)]:
+            rockpars = dict(nonshale=rnonshale, shale=rshale, vshale=activeRock['vclay'], phi=activeRock['phi'],
+                            vsgrad=activePresPf['OB_Grad'], depth=active['cur_depth'],
+                            initp=activePresPf[parp[0]], resp=activePresPf[parp[1]],
+                            mod=tuple(activeRock[par] for par in pardry))
+            if getattr(self, attr) is None:
+                setattr(self, attr, structRockModel(**rockpars))
+            else:
+                getattr(self, attr).set(**rockpars)
+
+    def calcPVT(self, activeFluid):
+        '''
+        :param activeFluid: row of the fluids file
+        :return: dict of temp, sal, api and grav if the fluids file gives them for the row, otherwise None
+        '''
+        if not all(par in activeFluid for par in self.column_names_pvt):
+            return None
+        pvt = dict((par, float(activeFluid[par])) for par in self.column_names_pvt)
+        return None if any(np.isnan(list(pvt.values()))) else pvt
+
+    def calcFluidPhases(self, activeFluid, pres):
+        '''
+        Fluids with pvt columns take the Batzle and Wang phase properties at the reservoir pressure,
+        otherwise the moduli and densities of the fluids file are used.
+        :param activeFluid: row of the fluids file
+        :param pres: current reservoir pressure (MPa)
+        :return: water, oil, gas tuples of bulk modulus, density and saturation
+        '''
+        phases = [[activeFluid[ind] for ind in par] for par in [['kw', 'rhow', 'sw'], ['ko', 'rhoo', 'so'],
+                                                              ['kg', 'rhog', 'sg']]]
+        pvt = self.calcPVT(activeFluid)
+        if pvt is not None:
+            for phase, bw in zip(phases, calcBWFluids(pres, pvt)):
+                phase[:2] = [float(prop) for prop in bw]
+        return tuple(tuple(phase) for phase in phases)
+
+    def updateFluids(self, active):
         # oil, water, gas, setup and mixing
-        parw = ['kw', 'rhow', 'sw']; paro = ['ko', 'rhoo', 'so']; parg = ['kg', 'rhog', 'sg']
-        self.activeObf_mix = structFluid(self.activeObf['Name'], water=[self.activeObf[ind] for ind in parw],
-                                                         oil=[self.activeObf[ind] for ind in paro],
-                                                         gas=[self.activeObf[ind] for ind in parg])
-        self.activeResF_mix = structFluid(self.activeResF['Name'], water=[self.activeResF[ind] for ind in parw],
-                                                           oil=[self.activeResF[ind] for ind in paro],
-                                                           gas=[self.activeResF[ind] for ind in parg])
-        # output fluid names to table
-        self.CDS_out.data['fluid'] = [self.activeObf['Name'], self.activeResF['Name']]
-
-
-    def updateRockModel(self):
-
-        # calculate rock models and properties
-        self.activeObrM = structRock(self.activeObr_dry, self.activeObf_mix)
-        self.activeObrM.calcGassmann(); self.activeObrM.calcDensity(); self.activeObrM.calcElastic()
-        self.activeResRM = structRock(self.activeResR_dry, self.activeResF_mix)
-        self.activeResRM.calcGassmann(); self.activeResRM.calcDensity(); self.activeResRM.calcElastic()
-
-        # output rockproperties to table
-        self.CDS_out.data['Vp'] = [self.activeObrM.velp, self.activeResRM.velp]
-        self.CDS_out.data['Vs'] = [self.activeObrM.vels, self.activeResRM.vels]
-        self.CDS_out.data['rho'] = [self.activeObrM.den, self.activeResRM.den]
-        self.CDS_out.data['other'] = [self.activeObrM.pimp, self.activeResRM.pimp]
+        for model, activeFluid in [(self.modelObr, active['activeObf']), (self.modelRes, active['activeResF'])]:
+            water, oil, gas = self.calcFluidPhases(activeFluid, active['activePresPf']['curr_Pres'])
+            model.set(water=water, oil=oil, gas=gas)
+
+    def calcRockOutputs(self, active):
+        '''
+        :param active: active selections, see calcSelection
+        :return: CDS_out columns, rock properties are calculated lazily by the rock models
+        '''
+        return dict(rock=[active['activeObr']['Name'], active['activeResR']['Name']],
+                    fluid=[active['activeObf']['Name'], active['activeResF']['Name']],
+                    Vp=np.array([self.modelObr.velp, self.modelRes.velp]),
+                    Vs=np.array([self.modelObr.vels, self.modelRes.vels]),
+                    rho=np.array([self.modelObr.den, self.modelRes.den]),
+                    other=np.array([self.modelObr.pimp, self.modelRes.pimp]))
+
+    def calcDepthProfiles(self, depth, active=None):
+        """
+        Elastic depth trends of the active overburden and reservoir selections.
+        :param depth: vector of depths (meters TVDSS), pressures are referenced to the depth slider
+        :keyword active: active selections (see calcSelection), default the applied selections
+        :return: dict of 'overburden' and 'reservoir' structRockBatch
+        """
+        if active is None:
+            active = dict((attr, getattr(self, attr)) for attr in ['activeObr', 'activeObf', 'activeResR',
+                                                                   'activeResF', 'activePresPf', 'cur_depth'])
+        profiles = dict()
+        for key, activeRock, activeFluid in [('overburden', active['activeObr'], active['activeObf']),
+                                             ('reservoir', active['activeResR'], active['activeResF'])]:
+            # fluid phases as the rock models so the profile agrees with CDS_out at the slider depth
+            phases = self.calcFluidPhases(activeFluid, active['activePresPf']['curr_Pres'])
+            fluid = dict(zip(structRockBatch.fluidcols, [prop for phase in phases for prop in phase]))
+            profiles[key] = structRockBatch.fromDepthProfile(activeRock, fluid, active['activePresPf'], depth,
+                                                             refdepth=active['cur_depth'])
+        return profiles
+
+    def calcTrendOutputs(self, active):
+        '''
+        :param active: active selections, see calcSelection
+        :return: CDS_trend columns over trend_depth, empty if the pressure profile has no Pres_Grad to
+                 keep the effective stress positive at shallow depths (see structRockBatch.fromDepthProfile)
+        '''
+        try:
+            profiles = self.calcDepthProfiles(self.trend_depth, active)
+        except ValueError:
+            return dict((key, np.array([])) for key in self.column_names_trend)
+        return dict(depth=self.trend_depth, obVp=profiles['overburden'].velp, obVs=profiles['overburden'].vels,
+                    resVp=profiles['reservoir'].velp, resVs=profiles['reservoir'].vels)
 
 if __name__ == "__main__":
     from os.path import dirname, join, split
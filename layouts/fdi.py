@@ -23,7 +23,10 @@ from bokeh.models import LinearColorMapper, ColorBar, ColumnDataSource, CustomJS
 from bokeh.models.widgets import Slider, RadioButtonGroup, Button
 from bokeh.plotting import figure
 
-from func.funcRP import calcDryFrame_dPres, calcVelp, calcVels, gassmann_dry2fluid, mixfluid
+from layouts.cdstransaction import cdsTransaction
+from layouts.scheduler import computeScheduler
+from func.funcRP import calcDryFrame_dPres, calcVelp, calcVels, gassmann_dry2fluid, mixfluid, calcBWFluids
+from functools import lru_cache
 
 javaDir = """
 function dir(object) {
@@ -36,17 +39,112 @@ function dir(object) {
 }
 """
 
+@lru_cache(maxsize=32)
+def calcFDIDryRows(pres, init_pres, Km_vrh, Gm_vrh, mod, phi, c):
+    '''
+    Dry frame moduli along the pressure axis, cached on the rock and pressure parameters.
+    :param pres: tuple of the pressure axis
+    :param mod: tuple Ek, Pk, Eg, Pg
+    :param c: tuple of critical porosity values
+    :return: dryk, dryg read only vectors over pres
+    '''
+    Ek, Pk, Eg, Pg = mod
+    pres = np.array(pres)
+    rows = (calcDryFrame_dPres(init_pres, pres, Km_vrh, Ek, Pk, phi, c=c),
+            calcDryFrame_dPres(init_pres, pres, Gm_vrh, Eg, Pg, phi, c=c))
+    for row in rows:
+        row.setflags(write=False)
+    return rows
+
+@lru_cache(maxsize=32)
+def calcFDIFluidCols(sw, pc_hyd_oil, pc_hyd_gas, water, oil, gas, pres=None, pvt=None):
+    '''
+    Mixed fluid along the saturation axis, cached on the fluid parameters.
+    :param sw: tuple of the water saturation axis
+    :param water, oil, gas: tuples of bulk modulus and density
+    :keyword pres: tuple of the pressure axis, only used with pvt
+    :keyword pvt: sorted tuple of pvt items (see funcRP.calcBWFluids), the phase properties then follow pressure
+    :return: fluidK, fluidRho read only arrays of shape (n_sw, 1) or (n_sw, n_pres) with pvt
+    '''
+    sw = np.array(sw)[:, np.newaxis]
+    if pvt is not None:
+        water, oil, gas = calcBWFluids(np.array(pres)[np.newaxis, :], dict(pvt))
+    cols = mixfluid(water=[water[0], water[1], sw], oil=[oil[0], oil[1], (1.-sw)*pc_hyd_oil],
+                    gas=[gas[0], gas[1], (1.-sw)*pc_hyd_gas])
+    for col in cols:
+        col.setflags(write=False)
+    return cols
+
+def toClientArray(ar, dtype=np.float32):
+    '''
+    Contiguous numpy array for a ColumnDataSource, sent to the browser as a binary buffer instead of JSON lists.
+    '''
+    return np.ascontiguousarray(ar, dtype=dtype)
+
+# Client side slicing of the impedance mesh for widgetFDI(clientside=True). Images may arrive as nested
+# arrays or as flat typed arrays depending on the bokeh transport, cell() reads either.
+fdi_client_js = """
+function cell(img, i, j, ncols) {
+    return (img[i] !== undefined && img[i].length !== undefined) ? img[i][j] : img[i*ncols + j];
+}
+function firstIndex(vec, val) {
+    for (var i = 0; i < vec.length; i++) {
+        if (vec[i] >= val) { return i; }
+    }
+    return vec.length - 1;
+}
+function updateSlices() {
+    var pres = vecsource.data['pres'], sw = vecsource.data['sw'];
+    var img = meshsource.data['image'][0];
+    var ipres = firstIndex(pres, slidePres.value), isat = firstIndex(sw, slideSat.value);
+    var cpres = [], csw = [], dimpcpres = [], dimpcsat = [];
+    for (var i = 0; i < sw.length; i++) {
+        cpres.push(pres[ipres]); dimpcpres.push(cell(img, i, ipres, pres.length));
+    }
+    for (var j = 0; j < pres.length; j++) {
+        csw.push(sw[isat]); dimpcsat.push(cell(img, isat, j, pres.length));
+    }
+    vecsource.data['cpres'] = cpres; vecsource.data['csw'] = csw;
+    vecsource.data['dimpcpres'] = dimpcpres; vecsource.data['dimpcsat'] = dimpcsat;
+    vecsource.change.emit();
+}
+"""
+
+fdi_toggle_js = """
+var absolute = (radioAbsRel.active == 0);
+meshsource.data['image'] = [absolute ? meshsource.data['mesh_pimp'][0] : meshsource.data['mesh_dpimp'][0]];
+meshsource.change.emit();
+cmapper.palette = absolute ? abspalette : relpalette;
+cmapper.low = absolute ? varsource.data['low_pimp'][0] : -varsource.data['amax_dpimp'][0];
+cmapper.high = absolute ? varsource.data['high_pimp'][0] : varsource.data['amax_dpimp'][0];
+yaxisPres.axis_label = absolute ? 'Impedance' : 'Delta Imp (%)';
+yaxisSat.axis_label = yaxisPres.axis_label;
+updateSlices();
+"""
+
+fdi_reset_js = """
+slidePres.value = varsource.data['cur_pres'][0];
+slideSat.value = varsource.data['cur_sat'][0];
+updateSlices();
+"""
+
 class widgetFDI(object):
 
     mesh_keys = ['image', 'mesh_sw', 'mesh_so', 'mesh_sg', 'mesh_pres', 'mesh_dryk', 'mesh_dryg', 'mesh_pimp', 'mesh_dpimp']
     vec_keys  = ['sw', 'so', 'sg', 'swso', 'pres', 'dimpcsat', 'dimpcpres', 'ipres', 'isw', 'cpres', 'csw']
+    # keys read by the glyphs and tooltips in the browser, only these are sent
+    client_mesh_keys = ['image', 'mesh_so', 'mesh_sg', 'mesh_pres']
+    client_vec_keys = ['pres', 'csw', 'cpres', 'sw', 'swso', 'dimpcsat', 'dimpcpres']
     patch_keys = ['psw','pso','psg','ysw','yhyd']
     var_keys = ['min_pres','max_pres','cur_pres','cur_sat','plot_scale','plot_dws','plot_dpres',
                 'high_pimp','low_pimp','high_dpimp','low_dpimp','amax_dpimp']
 
-    def __init__(self,plot_scale,min_pres,max_pres):
+    def __init__(self,plot_scale,min_pres,max_pres,scheduler=None,clientside=False):
         '''
         :param plot_scale: number of samples for mesh ploting [plot_scale x plot_scale]
+        :keyword scheduler: computeScheduler for the slider callbacks, default synchronous
+        :keyword clientside: If True the impedance meshes are sent once with each model and the slicing, crosshairs,
+                             Abs/Rel toggle and reset run in the browser (CustomJS), e.g. for static html export.
         '''
         #dump external variables
         self.min_pres = min_pres
@@ -58,11 +156,17 @@ class widgetFDI(object):
 
         #control defaults
         self.toggleAbs = False
+        self.clientside = clientside
+        if clientside:  # the browser swaps the image between the impedance meshes
+            self.client_mesh_keys = widgetFDI.client_mesh_keys + ['mesh_pimp', 'mesh_dpimp']
+        # batches the ColumnDataSource changes of each user action
+        self.cds = cdsTransaction()
+        self.scheduler = computeScheduler() if scheduler is None else scheduler
 
         # create data templates and dictionaries
-        self.mesh = [np.empty([plot_scale, plot_scale])]
+        self.mesh = [np.zeros([plot_scale, plot_scale])]
         self.mesh_dict = dict()
-        self.vec = np.empty(plot_scale)
+        self.vec = np.zeros(plot_scale)
         self.vec_dict = dict()
         self.patch = np.empty(3)
         self.patch_dict = dict()
@@ -80,8 +184,9 @@ class widgetFDI(object):
         self.var_dict['min_pres']=[min_pres]; self.var_dict['max_pres']=[max_pres]
         self.var_dict['plot_scale']=[plot_scale]
 
-        self.CDS_mesh = ColumnDataSource(self.mesh_dict)
-        self.CDS_vec = ColumnDataSource(self.vec_dict)
+        self.CDS_mesh = ColumnDataSource(dict((key, [toClientArray(self.mesh_dict[key][0])])
+                                              for key in self.client_mesh_keys))
+        self.CDS_vec = ColumnDataSource(dict((key, toClientArray(self.vec_dict[key])) for key in self.client_vec_keys))
         self.CDS_pat = ColumnDataSource(self.patch_dict)
         self.CDS_var = ColumnDataSource(self.var_dict)
 
@@ -153,10 +258,24 @@ class widgetFDI(object):
         self.radioAbsRel = RadioButtonGroup(labels=['Absolute','Relative'], active=1)
         self.buttonReset = Button(label='Reset Initial Conditions')
 
-        self.slidePres.on_change('value',self.updateCPres)
-        self.slideSat.on_change('value',self.updateCSat)
-        self.radioAbsRel.on_change('active',self.toggleAbsRel)
-        self.buttonReset.on_click(self.clickReset)
+        if self.clientside:
+            self.createClientCallbacks()
+        else:
+            self.slidePres.on_change('value',self.updateCPres)
+            self.slideSat.on_change('value',self.updateCSat)
+            self.radioAbsRel.on_change('active',self.toggleAbsRel)
+            self.buttonReset.on_click(self.clickReset)
+
+    def createClientCallbacks(self):
+        args = dict(meshsource=self.CDS_mesh, vecsource=self.CDS_vec, varsource=self.CDS_var,
+                    slidePres=self.slidePres, slideSat=self.slideSat, radioAbsRel=self.radioAbsRel,
+                    cmapper=self.dicm, abspalette=list(crainbow), relpalette=list(cbwr),
+                    yaxisPres=self.figCPresyaxis, yaxisSat=self.figCSatyaxis)
+        slicecb = CustomJS(args=args, code=fdi_client_js + "updateSlices();")
+        self.slidePres.js_on_change('value', slicecb)
+        self.slideSat.js_on_change('value', slicecb)
+        self.radioAbsRel.js_on_change('active', CustomJS(args=args, code=fdi_client_js + fdi_toggle_js))
+        self.buttonReset.js_on_click(CustomJS(args=args, code=fdi_client_js + fdi_reset_js))
 
     def createLayout(self):
         controls_row = row(self.slidePres,self.slideSat,self.radioAbsRel, self.buttonReset)
@@ -166,16 +285,37 @@ class widgetFDI(object):
     def updateCImpAndSat(self):#, pres, sat):
         '''
         Updates Impedance for constant saturation.
-        :param pres: Constant pressure to extract along.
-        :param sat:  Constant saturation to extract along.
         '''
-        ipres = np.argwhere(self.vec_dict['pres'] >= self.cur_pres)[0][0]
-        isat = np.argwhere(self.vec_dict['sw'] >= self.cur_sat)[0][0]
-        ar_cpres = self.vec_dict['cpres']*0+self.vec_dict['pres'][ipres]
-        ar_csat = self.vec_dict['csw']*0+self.vec_dict['sw'][isat]
-        self.CDS_vec.data['cpres'] = ar_cpres.tolist(); self.CDS_vec.data['csw'] = ar_csat.tolist()
-        self.CDS_vec.data['dimpcpres'] = self.mesh_dict['image'][:,ipres].tolist()
-        self.CDS_vec.data['dimpcsat'] = self.mesh_dict['image'][isat,:].tolist()
+        # slices still being calculated for an earlier model, image or slider position are stale
+        self.scheduler.cancel('cimpsat')
+        self.applyCImpAndSat(self.calcCImpAndSat(self.cur_pres, self.cur_sat))
+
+    def submitCImpAndSat(self):
+        # the worker gets the current vectors and image, applyModel replaces them on the document thread
+        self.scheduler.submit('cimpsat', self.calcCImpAndSat, self.applyCImpAndSat, self.cur_pres, self.cur_sat,
+                              vec=dict(self.vec_dict), image=self.mesh_dict['image'])
+
+    def calcCImpAndSat(self, cur_pres, cur_sat, vec=None, image=None):
+        '''
+        Impedance for constant pressure and saturation, does not modify any bokeh models.
+        :param cur_pres: Constant pressure to extract along.
+        :param cur_sat:  Constant saturation to extract along.
+        :keyword vec: vectors to use, default vec_dict
+        :keyword image: mesh to slice, default mesh_dict['image']
+        :return: dict of CDS_vec columns
+        '''
+        vec = self.vec_dict if vec is None else vec
+        image = self.mesh_dict['image'] if image is None else image
+        ipres = np.argwhere(vec['pres'] >= cur_pres)[0][0]
+        isat = np.argwhere(vec['sw'] >= cur_sat)[0][0]
+        ar_cpres = vec['cpres']*0+vec['pres'][ipres]
+        ar_csat = vec['csw']*0+vec['sw'][isat]
+        return dict(cpres=toClientArray(ar_cpres), csw=toClientArray(ar_csat),
+                    dimpcpres=toClientArray(image[:,ipres]),
+                    dimpcsat=toClientArray(image[isat,:]))
+
+    def applyCImpAndSat(self, columns):
+        self.cds.update(self.CDS_vec, **columns)
 
     def updateImpRanges(self):
         '''
@@ -187,117 +327,138 @@ class widgetFDI(object):
         self.var_dict['low_dimp'] = [np.min(self.mesh_dict['mesh_dpimp'])]
         self.var_dict['amax_dpimp'] = [np.amax(self.mesh_dict['mesh_dpimp'])]
 
-    def updateModel(self, resdryframe, resfluid, presmin, presmax, init_imp=None):
+    def updateModel(self, resdryframe, resfluid, presmin, presmax, init_imp=None, pvt=None):
         '''
         :param resdryframe: A dryframe rock model from structLith
         :param resfluid:    A fluid model from structLith
         :type presmin, presmax: Minimum and maximum pressure range to calculate over.
         :keyword init_imp: The initial impedance of the rock. Of None the absolute impedance will be plotted.
+        :keyword pvt: dict of temp, sal, api and grav (see funcRP.calcBWFluids). If given the phase moduli and
+                      densities follow the pressure axis (Batzle and Wang) instead of the constant resfluid values.
         '''
+        self.applyModel(self.calcModel(resdryframe, resfluid, presmin, presmax, init_imp=init_imp, pvt=pvt))
 
+    def calcModel(self, resdryframe, resfluid, presmin, presmax, init_imp=None, pvt=None):
+        '''
+        Calculates the meshes of updateModel without modifying the widget, so it may run on a worker thread.
+        :return: dict of the new mesh, vec and patch entries and the initial conditions, see applyModel
+        '''
+        mesh = dict(); vec = dict(); patch = dict()
         #extract variables from models
-        self.init_pres = resdryframe.resp
+        init_pres = resdryframe.resp
         Km_vrh = resdryframe.Km_vrh; Gm_vrh = resdryframe.Gm_vrh
-        Ek, Pk, Eg, Pg = resdryframe.mod
 
         # setup pressure variations
-        self.dpres = (presmax - presmin)/(self.plot_scale-1)
-        self.vec_dict['pres'] = np.arange(presmin,presmax+self.dpres,self.dpres)
+        dpres = (presmax - presmin)/(self.plot_scale-1)
+        vec['pres'] = np.arange(presmin,presmax+dpres,dpres)
 
         #setup water saturation variations
         kw, ko, kg = resfluid.getKs(); rhow, rhoo, rhog = resfluid.getRhos(); swi, soi, sgi = resfluid.getSats()
-        self.init_sw = swi
         pc_hyd_oil = soi / (1-swi); pc_hyd_gas = sgi / (1-swi)  #work out oil and gas pc
         dsw = 1.0 / (self.plot_scale - 1)                       # delta sw for plotting
-        self.vec_dict['sw'] = np.arange(0, 1 + dsw, dsw)        # saturation water
+        vec['sw'] = np.arange(0, 1 + dsw, dsw)                  # saturation water
 
         #update patches
-        self.patch_dict['psw']=[0,1,0]; self.patch_dict['pso']=[0,1,1-pc_hyd_gas]; self.patch_dict['psg']=[1-pc_hyd_gas,1,1]
+        patch['psw']=[0,1,0]; patch['pso']=[0,1,1-pc_hyd_gas]; patch['psg']=[1-pc_hyd_gas,1,1]
 
         #create meshes
-        self.mesh_dict['mesh_pres'], self.mesh_dict['mesh_sw'] = np.meshgrid(self.vec_dict['pres'], self.vec_dict['sw'])
-        self.mesh_dict['mesh_so'] = (1.-self.mesh_dict['mesh_sw'])*pc_hyd_oil             #saturation oil
-        self.mesh_dict['mesh_sg'] = (1.-self.mesh_dict['mesh_sw'])*pc_hyd_gas             #saturation gas
-        self.vec_dict['so'] = self.mesh_dict['mesh_so'][:,0]; self.vec_dict['sg'] = self.mesh_dict['mesh_sg'][:,0]
-        self.vec_dict['swso'] = 1-(self.vec_dict['sg'])     #saturation oil and water frac for plotting
-
-        mesh_mfluidK = np.empty(self.mesh_dict['mesh_sw'].shape)
-        mesh_mfluidRho = np.empty(self.mesh_dict['mesh_sw'].shape)
-        for i,row in enumerate(self.mesh_dict['mesh_sw']):
-            for j, val in enumerate(row):
-                mesh_mfluidK[i,j], mesh_mfluidRho[i,j] = mixfluid(water=[kw,rhow,self.mesh_dict['mesh_sw'][i,j]],
-                                                                  oil=[ko,rhoo,self.mesh_dict['mesh_so'][i,j]],
-                                                                  gas=[kg,rhog,self.mesh_dict['mesh_sg'][i,j]])
-        #calculate rockmodel moduli
-        self.mesh_dict['mesh_dryk'] = calcDryFrame_dPres(self.init_pres, self.mesh_dict['mesh_pres'],
-                                                         Km_vrh, Ek, Pk, resdryframe.phi, c=resdryframe.c)
-        self.mesh_dict['mesh_dryg'] = calcDryFrame_dPres(self.init_pres, self.mesh_dict['mesh_pres'],
-                                                         Gm_vrh, Eg, Pg, resdryframe.phi, c=resdryframe.c)
+        mesh['mesh_pres'], mesh['mesh_sw'] = np.meshgrid(vec['pres'], vec['sw'])
+        mesh['mesh_so'] = (1.-mesh['mesh_sw'])*pc_hyd_oil             #saturation oil
+        mesh['mesh_sg'] = (1.-mesh['mesh_sw'])*pc_hyd_gas             #saturation gas
+        vec['so'] = mesh['mesh_so'][:,0]; vec['sg'] = mesh['mesh_sg'][:,0]
+        vec['swso'] = 1-(vec['sg'])     #saturation oil and water frac for plotting
+
+        #fluid columns (saturation) and dry frame rows (pressure) are cached separately so a change of fluid
+        #or of rock/pressure only recalculates its own axis before the outer product fluid substitution
+        pres_key = tuple(vec['pres'])
+        mesh_mfluidK, mesh_mfluidRho = calcFDIFluidCols(tuple(vec['sw']), pc_hyd_oil, pc_hyd_gas,
+                                                        (kw, rhow), (ko, rhoo), (kg, rhog),
+                                                        pres=None if pvt is None else pres_key,
+                                                        pvt=None if pvt is None else tuple(sorted(pvt.items())))
+        dryk, dryg = calcFDIDryRows(pres_key, init_pres, Km_vrh, Gm_vrh, tuple(resdryframe.mod),
+                                    resdryframe.phi, tuple(resdryframe.c))
+        mesh_shape = mesh['mesh_pres'].shape
+        mesh['mesh_dryk'] = np.broadcast_to(dryk, mesh_shape)
+        mesh['mesh_dryg'] = np.broadcast_to(dryg, mesh_shape)
 
         #fluid substitution and and impedance calculation
-        mesh_satk = gassmann_dry2fluid(self.mesh_dict['mesh_dryk'],Km_vrh,mesh_mfluidK,resdryframe.phi)
+        mesh_satk = gassmann_dry2fluid(dryk[np.newaxis, :], Km_vrh, mesh_mfluidK, resdryframe.phi)
         mesh_rhob = resdryframe.rho + mesh_mfluidRho*resdryframe.phi
-        self.mesh_dict['mesh_pimp'] = calcVelp(mesh_satk, self.mesh_dict['mesh_dryg'], mesh_rhob) * mesh_rhob
-        self.mesh_dict['mesh_dpimp'] = 100.0 * (self.mesh_dict['mesh_pimp'] - init_imp)/init_imp
-        self.updateImpRanges()
-
-        self.toggleAbsRel('active',1,1)
-        self.mesh_dict['image'] = self.mesh_dict['mesh_dpimp']
-
-        # update constant impedance and saturation plots
-        self.cur_pres = self.init_pres;
-        self.cur_sat = self.init_sw
-        self.var_dict['cur_pres'] = [self.init_pres]
-        self.var_dict['cur_sat'] = [self.init_sw]
-        self.clickReset()
-
-        #push updates to keys in columnardatasource models
-        for key in self.mesh_keys:
-            self.CDS_mesh.data[key] = [self.mesh_dict[key].tolist()]
-        for key in self.vec_keys:
-            self.CDS_vec.data[key] = self.vec_dict[key].tolist()
-        for key in self.patch_keys:
-            self.CDS_pat.data[key] = self.patch_dict[key]
-        for key in self.var_keys:
-            self.CDS_var.data[key] = self.var_dict[key]
-        self.updateCImpAndSat()
+        mesh['mesh_pimp'] = np.broadcast_to(calcVelp(mesh_satk, dryg[np.newaxis, :], mesh_rhob) * mesh_rhob,
+                                            mesh_shape)
+        mesh['mesh_dpimp'] = 100.0 * (mesh['mesh_pimp'] - init_imp)/init_imp
+        return dict(mesh=mesh, vec=vec, patch=patch, init_pres=init_pres, init_sw=swi, dpres=dpres)
 
-    def toggleAbsRel(self,attribute,old,new):
-        if new == 0:
-            self.toggleAbs = True
-        if new == 1:
-            self.toggleAbs = False
-        if self.toggleAbs:  #Absolute Values of Impedance
-            self.mesh_dict['image'] = self.mesh_dict['mesh_pimp']
-            self.figCPres.yaxis.axis_label = "Impedance"
-            self.figCSat.yaxis.axis_label = "Impedance"
-            #self.figDImp.image.color_mapper = self.icm
-            self.dicm.palette = crainbow
-            self.dicm.low = self.var_dict['low_pimp'][0]; self.dicm.high = self.var_dict['high_pimp'][0]
-        else:               # % change values of impedance
+    def applyModel(self, model):
+        '''
+        Updates the widget and its ColumnDataSources with the result of calcModel.
+        '''
+        with self.cds:
+            self.mesh_dict.update(model['mesh']); self.vec_dict.update(model['vec'])
+            self.patch_dict.update(model['patch'])
+            self.init_pres = model['init_pres']; self.init_sw = model['init_sw']; self.dpres = model['dpres']
+            self.updateImpRanges()
+
+            self.toggleAbsRel('active',1,1)
             self.mesh_dict['image'] = self.mesh_dict['mesh_dpimp']
-            self.figCPres.yaxis.axis_label = "Delta Imp (%)"
-            self.figCSat.yaxis.axis_label = "Delta Imp (%)"
-            self.dicm.palette=cbwr
-            self.dicm.low = -1*self.var_dict['amax_dpimp'][0]; self.dicm.high = self.var_dict['amax_dpimp'][0]
 
-        self.CDS_mesh.data['image']= [self.mesh_dict['image'].tolist()]
-        self.updateCImpAndSat()
+            # update constant impedance and saturation plots
+            self.cur_pres = self.init_pres;
+            self.cur_sat = self.init_sw
+            self.var_dict['cur_pres'] = [self.init_pres]
+            self.var_dict['cur_sat'] = [self.init_sw]
+            self.clickReset()
+
+            #push updates to keys in columnardatasource models
+            self.cds.update(self.CDS_mesh, **dict((key, [toClientArray(self.mesh_dict[key])])
+                                                  for key in self.client_mesh_keys))
+            self.cds.update(self.CDS_vec, **dict((key, toClientArray(self.vec_dict[key])) for key in self.client_vec_keys))
+            self.cds.update(self.CDS_pat, **dict((key, self.patch_dict[key]) for key in self.patch_keys))
+            self.cds.update(self.CDS_var, **dict((key, self.var_dict[key]) for key in self.var_keys))
+            self.updateCImpAndSat()
+
+    def toggleAbsRel(self,attribute,old,new):
+        with self.cds:
+            if new == 0:
+                self.toggleAbs = True
+            if new == 1:
+                self.toggleAbs = False
+            if self.toggleAbs:  #Absolute Values of Impedance
+                self.mesh_dict['image'] = self.mesh_dict['mesh_pimp']
+                self.figCPres.yaxis.axis_label = "Impedance"
+                self.figCSat.yaxis.axis_label = "Impedance"
+                #self.figDImp.image.color_mapper = self.icm
+                self.dicm.palette = crainbow
+                self.dicm.low = self.var_dict['low_pimp'][0]; self.dicm.high = self.var_dict['high_pimp'][0]
+            else:               # % change values of impedance
+                self.mesh_dict['image'] = self.mesh_dict['mesh_dpimp']
+                self.figCPres.yaxis.axis_label = "Delta Imp (%)"
+                self.figCSat.yaxis.axis_label = "Delta Imp (%)"
+                self.dicm.palette=cbwr
+                self.dicm.low = -1*self.var_dict['amax_dpimp'][0]; self.dicm.high = self.var_dict['amax_dpimp'][0]
+
+            self.cds.update(self.CDS_mesh, image=[toClientArray(self.mesh_dict['image'])])
+            self.updateCImpAndSat()
 
     def updateCPres(self,attribute,old,new):
+        if new == self.cur_pres:    # set by clickReset which updates the slices itself
+            return
         self.cur_pres=new
-        self.updateCImpAndSat()
+        self.submitCImpAndSat()
 
     def updateCSat(self,attribute,old,new):
+        if new == self.cur_sat:
+            return
         self.cur_sat=new
-        self.updateCImpAndSat()
+        self.submitCImpAndSat()
 
     def clickReset(self):
-        self.cur_pres=self.init_pres
-        self.cur_sat=self.init_sw
-        self.slidePres.value=self.cur_pres
-        self.slideSat.value=self.cur_sat
-        self.updateCImpAndSat()
+        with self.cds:
+            self.cur_pres=self.init_pres
+            self.cur_sat=self.init_sw
+            self.slidePres.value=self.cur_pres
+            self.slideSat.value=self.cur_sat
+            self.updateCImpAndSat()
 
 if __name__ == "__main__":
 
@@ -321,11 +482,10 @@ if __name__ == "__main__":
     minnonclay = structMineral(NameR+'_nonclay',knonclay,munonclay,rhononclay)
     fluid = structFluid(NameF,water=[kw,rhow,sw],oil=[ko,rhoo,so],gas=[kg,rhog,sg])
     dryframe = structDryFrame(NameR+'_'+NameF,minnonclay,minclay,vclay,phi)
-    dryframe.calcRockMatrix(); dryframe.calcDryFrame(OB_Grad,idepth,init_Pres,curr_Pres,dryEk,dryPk,dryEg,dryPg)
+    dryframe = dryframe.calcDryFrame(OB_Grad,idepth,init_Pres,curr_Pres,dryEk,dryPk,dryEg,dryPg)
     rock = structRock(dryframe,fluid)
-    rock.calcGassmann(), rock.calcDensity(), rock.calcElastic()
 
-    fdi = widgetFDI(plot_scale, presmin, presmax)
+    fdi = widgetFDI(plot_scale, presmin, presmax, clientside=True)  # static html, slicing runs in the browser
     fdi.updateModel(dryframe,fluid,presmin,presmax,init_imp=rock.pimp)
 
     show(fdi.layout)
@@ -0,0 +1,151 @@
+###############################################################################
+
+# Author: Antony Hallam
+# Company: HWU
+# Date: 18-10-2026
+
+# File Name: scheduler.py
+
+# Synopsis:
+# Runs bokeh callback computations off the document thread, keeping only the
+# latest request for each key.
+
+###############################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+_shared_executor = None
+_shared_lock = Lock()
+
+
+def getSharedExecutor(maxworkers=4):
+    '''
+    Thread pool shared by every document served by the process.
+    '''
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=maxworkers)
+    return _shared_executor
+
+
+def _reraise(exc):
+    raise exc
+
+
+class computeScheduler(object):
+    """
+    Schedules compute/apply callback pairs. compute runs on a worker thread and apply receives its result on
+    the bokeh document thread (doc.add_next_tick_callback). Requests are keyed: while a request for a key is
+    running, later requests for the same key are coalesced so only the latest is run next, and the result of
+    a superseded request is discarded. Without a document compute and apply run synchronously.
+    """
+
+    def __init__(self, doc=None, executor=None):
+        '''
+        :keyword doc: bokeh Document (e.g. curdoc()), if None requests run synchronously
+        :keyword executor: concurrent.futures executor, default the shared thread pool
+        '''
+        self.doc = doc
+        self.executor = executor
+        if doc is not None and executor is None:
+            self.executor = getSharedExecutor()
+        self.lock = Lock()
+        self.generation = dict()  # key: number of the latest request
+        self.running = set()      # keys with a request on the executor
+        self.pending = dict()     # key: latest request waiting for the running one
+
+    def submit(self, key, compute, apply, *args, **kwargs):
+        '''
+        :param key: requests with the same key supersede each other
+        :param compute: function(*args, **kwargs) run on a worker, must not modify bokeh models
+        :param apply: function(result) run on the document thread
+        '''
+        if self.doc is None:
+            apply(compute(*args, **kwargs))
+            return
+        with self.lock:
+            gen = self.generation[key] = self.generation.get(key, 0) + 1
+            if key in self.running:
+                self.pending[key] = (gen, compute, apply, args, kwargs)
+                return
+            self.running.add(key)
+        self._start(key, gen, compute, apply, args, kwargs)
+
+    def cancel(self, key):
+        '''
+        Discards the result of a running request for key and drops its pending request, e.g. when the
+        document thread has applied newer state itself.
+        '''
+        with self.lock:
+            self.generation[key] = self.generation.get(key, 0) + 1
+            self.pending.pop(key, None)
+
+    def _start(self, key, gen, compute, apply, args, kwargs):
+        future = self.executor.submit(compute, *args, **kwargs)
+        future.add_done_callback(partial(self._done, key, gen, apply))
+
+    def _done(self, key, gen, apply, future):
+        with self.lock:
+            latest = self.generation[key] == gen
+            request = self.pending.pop(key, None)
+            if request is None:
+                self.running.discard(key)
+        if latest:
+            exc = future.exception()
+            if exc is None:
+                self.doc.add_next_tick_callback(partial(apply, future.result()))
+            else:  # raise on the document thread so bokeh reports it like any callback error
+                self.doc.add_next_tick_callback(partial(_reraise, exc))
+        if request is not None:
+            self._start(key, *request)
+
+
+if __name__ == "__main__":
+    from tests import test_msg, test_title_msg
+    from threading import Event
+    import time
+
+    class testDoc(object):
+        def __init__(self):
+            self.callbacks = []
+        def add_next_tick_callback(self, callback):
+            self.callbacks.append(callback)
+
+    test_title_msg('computeScheduler')
+    results = []
+    computeScheduler().submit('a', lambda x: x*2, results.append, 2)
+    test_msg('computeScheduler', 'synchronous without document', results, [4])
+
+    doc = testDoc(); results = []; computed = []
+    gate = Event()
+    def compute(x):
+        gate.wait(); computed.append(x)
+        return x
+    sched = computeScheduler(doc, executor=ThreadPoolExecutor(2))
+    for x in range(5):
+        sched.submit('slider', compute, results.append, x)
+    gate.set()
+    time.sleep(0.2)
+    for callback in doc.callbacks:
+        callback()
+    test_msg('computeScheduler', 'intermediate requests coalesced', computed, [0, 4])
+    test_msg('computeScheduler', 'only latest result applied', results, [4])
+
+    doc = testDoc(); results = []; gate.clear()
+    sched = computeScheduler(doc, executor=ThreadPoolExecutor(2))
+    sched.submit('slider', compute, results.append, 1)
+    sched.submit('slider', compute, results.append, 2)
+    sched.cancel('slider')
+    gate.set()
+    time.sleep(0.2)
+    for callback in doc.callbacks:
+        callback()
+    test_msg('computeScheduler', 'cancelled results discarded', results, [])
+    sched.submit('slider', compute, results.append, 3)
+    time.sleep(0.2)
+    for callback in doc.callbacks:
+        callback()
+    test_msg('computeScheduler', 'requests after cancel applied', results, [3])
@@ -20,6 +20,7 @@ from func.funcWave import *
 from func.funcFilter import *
 from data.structWave import structWave
 from templates.plots import *
+from layouts.scheduler import computeScheduler
 
 import bokeh.io as bki
 import bokeh.layouts as bkl
@@ -51,18 +52,24 @@ domFreq = bkw.Slider(title="Dom Frequency", value=25, start=0, end=50.0, step=1)
 
 
 
-# Set up callbacks
-def update_data(attrname, old, new):
-
-    # Get the current slider values
-    dF = domFreq.value
+# Set up callbacks, the wavelet is calculated off the document thread and only for the latest slider value
+scheduler = computeScheduler(bki.curdoc())
 
+def calc_data(dF):
     # Generate the new curve
     wave1.typeRicker(dF)
     wave1.calcAmpSpec()
+    return dict(time=wave1.timeseries,B=wave1.timeAmp), dict(freq=wave1.freqseries,B=wave1.ampSpec)
+
+def apply_data(data):
     print('update')
-    sw1.data=dict(time=wave1.timeseries,B=wave1.timeAmp)
-    sf1.data=dict(freq=wave1.freqseries,B=wave1.ampSpec)
+    sw1.data, sf1.data = data
+
+def update_data(attrname, old, new):
+
+    # Get the current slider values
+    dF = domFreq.value
+    scheduler.submit('ricker', calc_data, apply_data, dF)
 
 domFreq.on_change('value', update_data)
 inputs = bkl.widgetbox(domFreq)
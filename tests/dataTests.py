@@ -12,18 +12,158 @@
 ###############################################################################
 
 from data import structLith
+import numpy as np
 
 nonshale = structLith.structMineral('nonshale',70,35,2.74)
 shale = structLith.structMineral('shale',15,5,2.68)
 #oil, water, gas
 fluid = structLith.structFluid('fluid',[0.636,2.96,0.017],[0.686,1.056,0.145],[0.54,0.09,0.37])
-fluid.mixfluids()
 
 dryrock = structLith.structDryFrame('rock',nonshale,shale,0.05,0.2)
-dryrock.calcRockMatrix()
-dryrock.calcDryFrame(1*3.281*6.89476/1000,3180,12,12,0.45,15,0.75,16)
+dryrock = dryrock.calcDryFrame(1*3.281*6.89476/1000,3180,12,12,0.45,15,0.75,16)
 
 rock = structLith.structRock(dryrock,fluid)
-rock.calcGassmann()
-rock.calcDensity()
-rock.calcElastic()
\ No newline at end of file
+from tests import test_title_msg, test_msg
+
+test_title_msg('structAVOBatch')
+lith1 = structLith.structLith('shale','purple',3418.5,1753.0,2.51,135.4,87.4,0.029)
+lith2 = structLith.structLith('sand','orange',3663.5,2034.8,2.35,660.8,237.5,0.120)
+avobatch = structLith.structAVOBatch([[lith1,lith2,'orange'],[lith2,lith1,'purple']],500,1.5,0.4)
+test_msg('structAVOBatch','AVOMod shape',avobatch.AVOMod.shape,(2,500,9))
+test_msg('structAVOBatch','interface names',[intf.name for intf in avobatch],['shale on sand','sand on shale'])
+avobatch1 = structLith.structAVOBatch([[lith1,lith2,'orange'],[lith2,lith1,'purple']],1000,1.5,0.4,
+                                      seed=42,chunksize=300,nworkers=1)
+avobatch2 = structLith.structAVOBatch([[lith1,lith2,'orange'],[lith2,lith1,'purple']],1000,1.5,0.4,
+                                      seed=42,chunksize=300,nworkers=2)
+test_msg('structAVOBatch','reproducible across workers',avobatch1.AVOMod,avobatch2.AVOMod)
+
+test_title_msg('structAVOStream')
+avostream = structLith.structAVOStream([[lith1,lith2,'orange'],[lith2,lith1,'purple']],1000,1.5,0.4,
+                                       seed=42,chunksize=300)
+qcr_stream = avobatch1.AVOMod[:,:,[6,7,8]]
+test_msg('structAVOStream','mean',np.allclose(avostream.mean(),qcr_stream.mean(axis=1)),True)
+test_msg('structAVOStream','variance',np.allclose(avostream.var(),qcr_stream.var(axis=1,ddof=1)),True)
+act_p50 = avostream.quantiles()[:,:,1]
+qcr_p50 = np.percentile(qcr_stream,50,axis=1)
+qcr_binw = np.ptp(qcr_stream,axis=1)*2.2/avostream.stats.nbins
+test_msg('structAVOStream','P50 within bin width',bool(np.all(np.abs(act_p50-qcr_p50) <= qcr_binw)),True)
+
+test_title_msg('correlated sampling')
+corr = np.array([[1.0, 0.8, 0.5], [0.8, 1.0, 0.3], [0.5, 0.3, 1.0]])
+lith2.calcModel(100000,1.0,0.05,rng=np.random.default_rng(3),corr=corr)
+act_corr = np.corrcoef([lith2.VpMod, lith2.VsMod, lith2.RhoMod])
+test_msg('structLith.calcModel','correlation',np.allclose(act_corr,corr,atol=0.02),True)
+iter_mods = list(lith2.iterModel(100000,1.0,0.05,30000,rng=np.random.default_rng(3),corr=corr))
+act_itercorr = np.corrcoef([np.concatenate([mod[key] for mod in iter_mods]) for key in ['VpMod','VsMod','RhoMod']])
+test_msg('structLith.iterModel','correlation',np.allclose(act_itercorr,corr,atol=0.02),True)
+test_msg('structLith.calcCholesky','cached factor',lith2.calcCholesky(1.0,corr) is lith2.calcCholesky(1.0,corr),True)
+act_corrbatch = structLith.structAVOBatch([[lith1,lith2,'orange']],1000,1.5,0.4,seed=42,chunksize=300,corr=corr)
+test_msg('structAVOBatch','correlated AVOMod shape',act_corrbatch.AVOMod.shape,(1,1000,9))
+
+test_title_msg('structRockBatch')
+batch_rock = dict(kclay=[15,15], muclay=[5,5], rhoclay=[2.68,2.68], knonclay=[70,70], munonclay=[35,35],
+                  rhononclay=[2.74,2.74], vclay=[0.05,0.05], phi=[0.2,0.25], dryEk=[0.45,0.45], dryPk=[15,15],
+                  dryEg=[0.75,0.75], dryPg=[16,16])
+batch_fluid = dict(kw=2.96, rhow=1.056, sw=0.09, ko=0.636, rhoo=0.686, so=0.54, kg=0.017, rhog=0.145, sg=0.37)
+batch_pres = {'OB_Grad':1*3.281*6.89476/1000, 'init_Pres':12, 'curr_Pres':12}
+rockbatch = structLith.structRockBatch(batch_rock, batch_fluid, batch_pres, 3180)
+batchfluid = structLith.structFluid('batchfluid',[2.96,1.056,0.09],[0.636,0.686,0.54],[0.017,0.145,0.37])
+batchrock = structLith.structRock(dryrock,batchfluid)
+test_msg('structRockBatch','velp matches structRock',np.round(rockbatch.velp[0],10),np.round(batchrock.velp,10))
+test_msg('structRockBatch','pimp matches structRock',np.round(rockbatch.pimp[0],10),np.round(batchrock.pimp,10))
+test_msg('structRockBatch','shape',rockbatch.velp.shape,(2,))
+
+test_title_msg('structRecord')
+import pickle
+test_msg('structRecord','updateSat returns new fluid',fluid.updateSat([0.2,0.3,0.5]).getSats(),[0.2,0.3,0.5])
+test_msg('structRecord','updateSat leaves original',fluid.getSats(),[0.017,0.145,0.37])
+test_msg('structRecord','equal and hashable',len({fluid, structLith.structFluid('fluid',*fluid._astuple()[1:])}),1)
+test_msg('structRecord','pickle round trip',pickle.loads(pickle.dumps(rock)).velp,rock.velp)
+test_msg('structRecord','updatePres',dryrock.updatePres(10).peff,dryrock.vstress-10)
+try:
+    rock.velp = 0
+    test_msg('structRecord','immutable','set','AttributeError')
+except AttributeError:
+    test_msg('structRecord','immutable','AttributeError','AttributeError')
+
+test_title_msg('structLith caches')
+structLith.cacheClear()
+for i in range(3):
+    cdry = structLith.getDryFrame('rock',structLith.structMineral('nonshale',70,35,2.74),shale,0.05,0.2,
+                                  1*3.281*6.89476/1000,3180+i%2,12,12,(0.45,15,0.75,16))
+    crock = structLith.getRock(cdry, structLith.getFluid('fluid',*fluid._astuple()[1:]))
+cinfo = structLith.cacheInfo()
+test_msg('structLith caches','getDryFrame hits/misses',(cinfo['getDryFrame'].hits,cinfo['getDryFrame'].misses),(1,2))
+test_msg('structLith caches','matrix shared across depths',cinfo['calcMatrixCached'].misses,1)
+test_msg('structLith caches','getRock matches structRock',crock.velp,structLith.structRock(cdry,fluid).velp)
+logdry = structLith.structDryFrame('log',nonshale,shale,np.array([0.05,0.1]),np.array([0.2,0.15]))
+logdry = logdry.calcDryFrame(1*3.281*6.89476/1000,3180,12,10,0.45,15,0.75,16)
+test_msg('structLith caches','array dry frame uncached',np.round(logdry.Kdry[0],10),np.round(dryrock.updatePres(10).Kdry,10))
+test_msg('structLith caches','array rock uncached',structLith.getRock(logdry,fluid).velp.shape,(2,))
+
+test_title_msg('structRockModel')
+rockmodel = structLith.structRockModel.fromRecords(dryrock, fluid)
+test_msg('structRockModel','velp matches structRock',rockmodel.velp,rock.velp)
+test_msg('structRockModel','matrix matches structDryFrame',rockmodel.Km_vrh,dryrock.Km_vrh)
+rockmodel.updateSat([0.2,0.3,0.5])
+test_msg('structRockModel','saturation change',rockmodel.velp,structLith.structRock(dryrock,fluid.updateSat([0.2,0.3,0.5])).velp)
+test_msg('structRockModel','saturation change keeps dry frame',(rockmodel.recomputes['dry'],rockmodel.recomputes['fluid']),(1,2))
+rockmodel.updatePres(10); rockmodel.Km_vrh
+test_msg('structRockModel','pressure change',rockmodel.pimp,
+         structLith.structRock(dryrock.updatePres(10),fluid.updateSat([0.2,0.3,0.5])).pimp)
+test_msg('structRockModel','pressure change keeps matrix and fluid',
+         (rockmodel.recomputes['matrix'],rockmodel.recomputes['fluid'],rockmodel.recomputes['dry']),(1,2,2))
+structLith.cacheClear()
+fluidA = dict(water=fluid.water, oil=fluid.oil, gas=fluid.gas)
+fluidB = dict(water=batchfluid.water, oil=batchfluid.oil, gas=batchfluid.gas)
+rockmodel.set(**fluidA); velpA = rockmodel.velp
+rockmodel.set(**fluidB); rockmodel.velp
+rockmodel.set(**fluidA)
+test_msg('structRockModel','fluid toggle back',rockmodel.velp,velpA)
+cinfo = structLith.cacheInfo()
+test_msg('structRockModel','fluid toggle back hits caches',(cinfo['getFluid'].hits,cinfo['getRock'].hits,
+         cinfo['getDryFrame'].misses),(1,1,0))
+
+test_title_msg('structRockBatch depth profile')
+profdepth = np.array([2000.,2500.,3180.,3500.,4000.])
+profrock = dict((k,v[0]) for k,v in batch_rock.items())
+prof = structLith.structRockBatch.fromDepthProfile(profrock, batch_fluid, dict(batch_pres, curr_Pres=10), profdepth)
+test_msg('structRockBatch depth profile','shape',prof.velp.shape,(5,))
+test_msg('structRockBatch depth profile','matches structRock at depth',np.round(prof.velp[2],10),
+         np.round(structLith.structRock(dryrock.updatePres(10),batchfluid).velp,10))
+prof = structLith.structRockBatch.fromDepthProfile(profrock, batch_fluid, dict(batch_pres, Pres_Grad=0.0098),
+                                                   profdepth, refdepth=3180)
+test_msg('structRockBatch depth profile','hydrostatic pressure gradient',np.round(prof.curr_Pres[[0,2,4]],4).tolist(),
+         [0.4360,12.,20.036])
+prof = structLith.structRockBatch.fromDepthProfile(profrock, batch_fluid, dict(batch_pres, Pres_Grad=0.0098),
+                                                   np.array([0.,500.]), refdepth=3180)
+test_msg('structRockBatch depth profile','pressure not below zero',prof.curr_Pres.tolist(),[0.,0.])
+prof = structLith.structRockBatch.fromDepthProfile(profrock, batch_fluid, dict(batch_pres, curr_Pres=10, Pres_Grad=0.0098),
+                                                   np.linspace(2500,10000,11), refdepth=3180)
+test_msg('structRockBatch depth profile','velocity varies with depth',bool(np.all(np.diff(prof.velp) != 0)),True)
+try:
+    structLith.structRockBatch.fromDepthProfile(profrock, batch_fluid, batch_pres, np.linspace(0,10000,11))
+    test_msg('structRockBatch depth profile','negative effective stress','none','ValueError')
+except ValueError:
+    test_msg('structRockBatch depth profile','negative effective stress','ValueError','ValueError')
+
+test_title_msg('structRPT')
+from data.structRPT import structRPT
+rpt = structRPT(profrock, batch_fluid, batch_pres, 3180, phi=np.linspace(0.05,0.3,6), vclay=[0.05,0.2,0.4],
+                sw=np.linspace(0,1,11), curr_pres=[8,12,16])
+test_msg('structRPT','cube shape',rpt['pimp'].shape,(6,3,11,3))
+subrpt = rpt.sel(phi=0.2, vclay=0.05, sw=0.1, pres=12)
+test_msg('structRPT','sliced sub-cube',subrpt['velp'].shape,(1,1,1,1))
+lazyrpt = structRPT(profrock, batch_fluid, batch_pres, 3180, phi=np.linspace(0.05,0.3,6), vclay=[0.05,0.2,0.4],
+                    sw=np.linspace(0,1,11), curr_pres=[8,12,16]).sel(phi=0.2, vclay=0.05, sw=0.1, pres=12)
+test_msg('structRPT','lazy sub-cube matches',lazyrpt['velp'],subrpt['velp'])
+test_msg('structRPT','matches structRockBatch',np.round(subrpt['velp'].ravel()[0],10),
+         np.round(structLith.structRockBatch(profrock, dict(batch_fluid, sw=0.1, so=0.9, sg=0), batch_pres, 3180).velp,10))
+test_msg('structRPT','toDataFrame rows',len(rpt.isel(pres=0).toDataFrame()),6*3*11)
+
+test_title_msg('structFluid Batzle-Wang')
+bwpvt = dict(temp=80, sal=0.05, api=35, grav=0.65)
+bwfluid = structLith.structFluid.fromBW('bw', 30, bwpvt, [0.2,0.8,0.])
+test_msg('structFluid Batzle-Wang','water modulus',np.round(bwfluid.water[0],3),2.789)
+test_msg('structFluid Batzle-Wang','oil density',np.round(bwfluid.oil[1],3),0.822)
+test_msg('structFluid Batzle-Wang','pressure dependent',structLith.structFluid.fromBW('bw', 10, bwpvt, [0.2,0.8,0.]).K < bwfluid.K,True)